@@ -0,0 +1,135 @@
+"""
+Computer players, usable as selfplay strategies.
+
+GreedyBot plays the highest scoring move. EquityBot plays the move with
+the highest equity: its score plus the value of the tiles it leaves on
+the rack, so that it does not, say, spend a blank for a few points.
+
+Both take an optional time budget per move in seconds. Move generation
+and the equity bot's evaluation stop once the budget is spent, and the
+bot picks the best of the moves looked at so far.
+"""
+import time
+
+from constants import *
+from scrabble import TILE_SLOTS, TILES, rack_letter
+
+
+# Value of keeping each tile, roughly how much it adds to future scores
+LEAVE_TILE_VALUES = {
+    'a': 1.0, 'b': -2.0, 'c': 0.5, 'd': 0.5, 'e': 1.5, 'f': -2.0, 'g': -2.0,
+    'h': 1.0, 'i': -0.5, 'j': -1.5, 'k': -1.0, 'l': -0.5, 'm': 0.5,
+    'n': 0.5, 'o': -1.5, 'p': -0.5, 'q': -7.0, 'r': 1.0, 's': 8.0,
+    't': 0.0, 'u': -4.5, 'v': -5.5, 'w': -4.0, 'x': 3.5, 'y': -0.5,
+    'z': 5.0, BLANK: 25.0,
+}
+# Cost of each extra copy of a tile left on the rack
+DUPLICATE_PENALTY = 4.0
+
+_TILE_VALUES = [LEAVE_TILE_VALUES[tile] for tile in TILES]
+
+# Moves the equity bot evaluates between two looks at the clock
+EVALUATION_STEPS = 64
+
+# A rack can only be exchanged with at least this many tiles in the bag
+EXCHANGE_MIN_BAG = 7
+
+
+def heuristic_leave(counts):
+    """
+    Returns the value of a leave from its tile counts, indexed by
+    TILE_SLOTS: the value of each tile, less a penalty for duplicates.
+    """
+    ret = 0.0
+    for slot, count in enumerate(counts):
+        if count:
+            ret += _TILE_VALUES[slot]*count - DUPLICATE_PENALTY*(count - 1)
+    return ret
+
+def rack_counts(rack):
+    """
+    Returns the tile counts of a rack, indexed by TILE_SLOTS.
+    """
+    counts = [0]*len(TILES)
+    for letter in rack:
+        counts[TILE_SLOTS[letter]] += 1
+    return counts
+
+
+class GreedyBot():
+    """
+    Plays the highest scoring move. With no move, exchanges the whole rack
+    if the bag allows it and passes otherwise.
+    """
+    def __init__(self, budget=None):
+        self.budget = budget
+
+    def __call__(self, game):
+        deadline = self._deadline()
+        moves = game.generate_moves(deadline=deadline)
+        if moves:
+            return self.choose(game, moves, deadline)
+        return self.no_move(game)
+
+    def _deadline(self):
+        if self.budget is None:
+            return None
+        return time.perf_counter() + self.budget
+
+    def choose(self, game, moves, deadline=None):
+        """
+        Returns the tiles of the move to play out of `moves`, the (tiles,
+        score) pairs from Scrabble.generate_moves, by `deadline` (a
+        time.perf_counter() value) if given.
+        """
+        return moves[0][0]
+
+    def no_move(self, game):
+        """
+        Returns what to do when there is no move to play.
+        """
+        if game.num_remaining_tiles() >= EXCHANGE_MIN_BAG:
+            return ''.join(game.get_rack())
+        return None
+
+
+class EquityBot(GreedyBot):
+    """
+    Plays the move with the highest score plus leave value. `leave_value`
+    takes the tile counts left on the rack, indexed by TILE_SLOTS, a
+    leaves.LeaveTable for instance. Leaves count for nothing once the bag
+    is empty.
+    """
+    def __init__(self, leave_value=heuristic_leave, budget=None):
+        GreedyBot.__init__(self, budget)
+        self.leave_value = leave_value
+
+    def choose(self, game, moves, deadline=None):
+        if game.num_remaining_tiles() == 0:
+            return moves[0][0]
+
+        rack = rack_counts(game.get_rack())
+        best = None
+        best_equity = None
+        for i, (tiles, score) in enumerate(moves):
+            # Moves come highest score first, so stopping early keeps the
+            # likeliest ones
+            if (deadline is not None and i % EVALUATION_STEPS == 0 and i > 0
+                    and time.perf_counter() > deadline):
+                break
+            for _, _, letter in tiles:
+                rack[TILE_SLOTS[rack_letter(letter)]] -= 1
+            equity = score + self.leave_value(rack)
+            for _, _, letter in tiles:
+                rack[TILE_SLOTS[rack_letter(letter)]] += 1
+            if best_equity is None or equity > best_equity:
+                best = tiles
+                best_equity = equity
+        return best
+
+
+# Bots by name, for the selfplay command line
+BOTS = {
+    'greedy': GreedyBot,
+    'equity': EquityBot,
+}
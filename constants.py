@@ -95,6 +95,16 @@ LETTERS_FREQS = {
     ' ': 2,
 }
 
+# Rack letter of a blank tile. Once played, a blank is written on the
+# board as the uppercase letter it stands for.
+BLANK = ' '
+
+# Bonus for playing all seven tiles in one turn
+BINGO_BONUS = 50
+
+# Most players a game can have
+MAX_PLAYERS = 4
+
 LETTER_SCORE = {
     'a': 1,
     'b': 3,
@@ -0,0 +1,355 @@
+'''
+A GADDAG built from the TWL06 word list in twl, for generating moves
+outwards from an anchor square in both directions.
+
+For every word and every split point, the GADDAG stores the letters
+before the split reversed, a separator, then the letters after it.
+'care' is stored as:
+
+    c^are
+    ac^re
+    rac^e
+    erac
+
+(the last split, with the whole word reversed, needs no separator).
+Starting from a letter on the board, a move generator walks leftwards
+by following the reversed part, then crosses the separator and walks
+rightwards. Every word through the anchor is reached exactly once.
+
+The graph is minimized like the DAWG and stored in the same compact
+record format:
+
+MLLLLLLL IIIIIIII IIIIIIII IIIIIIII
+
+M - More Flag
+L - ASCII Letter (lowercase, '^' or '$')
+I - Index (Pointer)
+
+Building it takes a few tens of seconds, so it is only done on first
+use. Call use_cache(path) to keep the built records in a binary file
+that is memory-mapped on later loads. The file carries a digest of the
+embedded twl data and a CRC, and is rebuilt when either does not match.
+
+Sample usage:
+
+>>> import gaddag
+>>> c = gaddag.cursor()
+>>> all(c.push(letter) for letter in 'ac^re')
+True
+>>> c.word, c.is_word()
+('care', True)
+>>> sorted(gaddag.words_through('at', 'ch'))
+[('at', 0), ('cat', 1), ('chat', 2), ('hat', 1)]
+'''
+
+import array
+import time
+
+import twl
+
+SEPARATOR = '^'
+
+# Child mask bits: 'a'-'z', then END, then SEPARATOR
+END_BIT = twl.END_BIT
+SEPARATOR_BIT = END_BIT << 1
+
+CACHE_MAGIC = b'GDAG'
+CACHE_VERSION = 1
+CACHE_SECTIONS = (
+    ('records', twl.RECORD_TYPECODE),
+    ('record_masks', 'i'),
+)
+
+# Built on first use by _gaddag()
+_GADDAG = None
+_LOAD_TIME = None
+_CACHE_PATH = None
+
+def cursor():
+    '''
+    Returns a GaddagCursor at the root of the GADDAG.
+    '''
+    return _gaddag().cursor()
+
+def words_through(fragment, letters):
+    '''
+    Returns a list of (word, start) pairs for the words that contain
+    `fragment` at word[start:] and whose other letters all come from
+    `letters`, which may include '?' blanks. This is the GADDAG walk a
+    move generator does from the letters already on the board: the
+    fragment is followed reversed, the word is extended leftwards from
+    the rack, then the separator is crossed and it is extended
+    rightwards.
+    '''
+    return _gaddag().words_through(fragment, letters)
+
+def load():
+    '''
+    Builds (or loads from the cache) the GADDAG now instead of on first
+    use and returns the number of seconds it took.
+    '''
+    _gaddag()
+    return _LOAD_TIME
+
+def load_time():
+    '''
+    Returns the number of seconds it took to build or load the GADDAG,
+    or None if it has not been loaded yet.
+    '''
+    return _LOAD_TIME
+
+def use_cache(path):
+    '''
+    Loads the GADDAG from a binary cache file at `path`, memory-mapped
+    read-only, building and writing it first if the file is missing,
+    corrupt or out of date. Pass None to build it in memory instead.
+
+    Must be called before the GADDAG is first used.
+    '''
+    global _CACHE_PATH
+    _CACHE_PATH = path
+
+def write_cache(path):
+    '''
+    Writes the GADDAG records and child masks to a binary cache file at
+    `path`, via a temporary file renamed into place.
+    '''
+    gaddag = _GADDAG if _GADDAG is not None else Gaddag(build_records())
+    twl.write_sections(path, CACHE_MAGIC, CACHE_VERSION, twl.data_digest(), [
+        (getattr(gaddag, name), typecode) for name, typecode in CACHE_SECTIONS])
+
+def _gaddag():
+    if _GADDAG is None:
+        _load()
+    return _GADDAG
+
+def _load():
+    global _GADDAG, _LOAD_TIME
+    start = time.perf_counter()
+    if _CACHE_PATH is not None:
+        try:
+            gaddag = _open_cache(_CACHE_PATH)
+        except (OSError, ValueError):
+            write_cache(_CACHE_PATH)
+            gaddag = _open_cache(_CACHE_PATH)
+    else:
+        gaddag = Gaddag(build_records())
+    _LOAD_TIME = time.perf_counter() - start
+    _GADDAG = gaddag
+
+def _open_cache(path):
+    '''
+    Memory-maps a cache file written by write_cache. Raises ValueError
+    if it does not match the twl data or fails its checksum.
+    '''
+    (records, record_masks), mapped = twl.read_sections(
+        path, CACHE_MAGIC, CACHE_VERSION, twl.data_digest(),
+        [typecode for _, typecode in CACHE_SECTIONS])
+    gaddag = Gaddag(records, record_masks)
+    # Keep the mapping alive as long as the views into it
+    gaddag.mapped = mapped
+    return gaddag
+
+def letter_bit(letter):
+    '''
+    Returns the bit for `letter` (including END and SEPARATOR) in a
+    GADDAG child mask.
+    '''
+    if letter == SEPARATOR:
+        return SEPARATOR_BIT
+    return twl.letter_bit(letter)
+
+def build_records():
+    '''
+    Builds the minimized GADDAG of every twl word and returns its
+    records. The GADDAG strings are generated, sorted and added one at a
+    time; once a string no longer shares a prefix with the next one,
+    the nodes past the shared prefix are final and are merged with an
+    identical node already seen, if any (Daciuk et al. 2000).
+    '''
+    strings = []
+    for chunk in twl.iterator(twl.ITER_CHUNK):
+        for word in chunk:
+            for split in range(1, len(word)):
+                strings.append(word[split - 1::-1] + SEPARATOR + word[split:])
+            strings.append(word[::-1])
+    strings.sort()
+
+    # Frozen nodes are (final, ((letter, node), ...)) keyed to their id
+    register = {}
+    nodes = []
+    def freeze(edges, final):
+        key = (final, tuple(edges))
+        node = register.get(key)
+        if node is None:
+            node = len(nodes)
+            register[key] = node
+            nodes.append(key)
+        return node
+
+    # Nodes of the previous string not frozen yet: [letter, edges, final]
+    path = [[None, [], False]]
+    previous = ''
+    for string in strings:
+        shared = 0
+        limit = min(len(string), len(previous))
+        while shared < limit and string[shared] == previous[shared]:
+            shared += 1
+        while len(path) > shared + 1:
+            letter, edges, final = path.pop()
+            path[-1][1].append((letter, freeze(edges, final)))
+        for letter in string[shared:]:
+            path.append([letter, [], False])
+        path[-1][2] = True
+        previous = string
+    while len(path) > 1:
+        letter, edges, final = path.pop()
+        path[-1][1].append((letter, freeze(edges, final)))
+    root = freeze(path[0][1], path[0][2])
+    return _pack_records(nodes, root)
+
+def _pack_records(nodes, root):
+    '''
+    Lays the frozen nodes out as runs of records, root first, with END
+    (if final) before the edges, which are already in letter order.
+    '''
+    order = [root] + [node for node in range(len(nodes)) if node != root]
+    starts = [0] * len(nodes)
+    index = 0
+    for node in order:
+        final, edges = nodes[node]
+        starts[node] = index
+        index += len(edges) + final
+    if index > twl.LINK_MASK:
+        raise ValueError('GADDAG too large for 24-bit record links')
+    records = array.array(twl.RECORD_TYPECODE)
+    for node in order:
+        final, edges = nodes[node]
+        run = []
+        if final:
+            run.append((ord(twl.END), 0))
+        for letter, child in edges:
+            run.append((ord(letter), starts[child]))
+        for i, (code, link) in enumerate(run):
+            more = twl.MORE_MASK if i < len(run) - 1 else 0
+            records.append(more | (code << 24) | link)
+    return records
+
+class GaddagCursor(object):
+    '''
+    A position in the GADDAG with the stack of nodes leading to it.
+    Letters pushed before the SEPARATOR extend the word leftwards from
+    the anchor, letters after it extend it rightwards.
+    '''
+    def __init__(self, gaddag):
+        self._gaddag = gaddag
+        self._nodes = [0]
+        self._letters = []
+        self._separator = None
+
+    @property
+    def word(self):
+        '''
+        The letters pushed so far, in reading order.
+        '''
+        if self._separator is None:
+            return ''.join(reversed(self._letters))
+        left = self._letters[:self._separator]
+        right = self._letters[self._separator + 1:]
+        return ''.join(reversed(left)) + ''.join(right)
+
+    @property
+    def turned(self):
+        '''
+        True once the SEPARATOR has been pushed.
+        '''
+        return self._separator is not None
+
+    def push(self, letter):
+        '''
+        Follows the edge for `letter` (or SEPARATOR). Returns False,
+        leaving the cursor unchanged, if there is none.
+        '''
+        if letter == SEPARATOR and self._separator is not None:
+            return False
+        child = self._gaddag._get_child(self._nodes[-1], letter)
+        if child in (0, None):
+            return False
+        if letter == SEPARATOR:
+            self._separator = len(self._letters)
+        self._nodes.append(child)
+        self._letters.append(letter)
+        return True
+
+    def pop(self):
+        '''
+        Removes and returns the last letter pushed.
+        '''
+        if not self._letters:
+            raise IndexError('pop from an empty cursor')
+        self._nodes.pop()
+        letter = self._letters.pop()
+        if letter == SEPARATOR:
+            self._separator = None
+        return letter
+
+    def is_word(self):
+        '''
+        True if the letters pushed so far spell a word.
+        '''
+        return bool(self.child_mask() & END_BIT)
+
+    def child_mask(self):
+        '''
+        Returns the mask of letters (and END or SEPARATOR) that may be
+        pushed next, see letter_bit().
+        '''
+        return self._gaddag.record_masks[self._nodes[-1]]
+
+class Gaddag(twl.RecordGraph):
+    '''
+    The GADDAG records, scanned like twl's with SEPARATOR added to the
+    child masks.
+    '''
+    letter_bit = staticmethod(letter_bit)
+    def cursor(self):
+        return GaddagCursor(self)
+    def words_through(self, fragment, letters):
+        counts = dict((letter, 0) for letter in twl.ALPHABET)
+        wilds = 0
+        for letter in letters:
+            if letter == twl.WILD:
+                wilds += 1
+            elif letter in counts:
+                counts[letter] += 1
+        cursor = self.cursor()
+        for letter in reversed(fragment):
+            if not cursor.push(letter):
+                return []
+        results = []
+        def extend(wilds, left):
+            mask = cursor.child_mask()
+            if mask & END_BIT:
+                word = cursor.word
+                results.append((word, left))
+            if not cursor.turned and mask & SEPARATOR_BIT:
+                cursor.push(SEPARATOR)
+                extend(wilds, left)
+                cursor.pop()
+            for slot, letter in enumerate(twl.ALPHABET):
+                if not mask & (1 << slot):
+                    continue
+                if counts[letter]:
+                    counts[letter] -= 1
+                    used = wilds
+                elif wilds:
+                    used = wilds - 1
+                else:
+                    continue
+                cursor.push(letter)
+                extend(used, left if cursor.turned else left + 1)
+                cursor.pop()
+                if used == wilds:
+                    counts[letter] += 1
+        extend(wilds, 0)
+        return results
@@ -0,0 +1,165 @@
+"""
+Fits rack leave values to self-play move logs.
+
+Each move that leaves tiles on the rack, with the bag refilling it, gives
+a sample: the leave, and the score of the same player's next move. The
+value of a leave is fitted as a linear function of its features (the
+count of each tile, duplicates, the vowel and consonant balance and a q
+without a u), by least squares against those next-move scores with an
+intercept for the average score. A leave with no tiles is worth 0.
+
+Logs are read one game at a time and samples are turned into features a
+batch at a time with NumPy, adding into the normal equations, so memory
+does not grow with the size of the logs. The fitted values of every leave
+are then written as a leaves table.
+
+NumPy is only needed here, and is imported when a fit starts.
+
+    python selfplay.py --games 100000 --bots equity equity --log games.log.gz
+    python leavefit.py fitted.leaves games.log.gz
+"""
+import argparse
+import array
+
+from constants import *
+from leaves import MAX_LEAVE, LeaveTable, iter_leaves, write_table
+from scrabble import TILE_SLOTS, TILES
+from selfplay import iter_log
+
+
+# Samples turned into features at a time
+BATCH_SIZE = 65536
+
+# Weight of the ridge penalty keeping rarely seen features near 0
+RIDGE = 1.0
+
+VOWELS = 'aeiou'
+
+# Intercept, tile counts, extra copies of each tile, vowel and consonant
+# imbalance, q without u
+NUM_FEATURES = 1 + 2*len(TILES) + 2
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('Fitting leave values needs NumPy, pip install numpy')
+    return numpy
+
+def iter_samples(games):
+    """
+    Yields (leave, score) for each move of `games` (as from
+    selfplay.iter_log) after which the bag refilled the rack. `leave` is
+    the tiles kept, `score` what the player scored on their next move.
+    """
+    for game in games:
+        last = {}
+        for player, rack, used, score in game:
+            if player in last and len(rack) == 7:
+                yield last[player], score
+            leave = list(rack)
+            for letter in used:
+                leave.remove(letter)
+            if 0 < len(leave) <= MAX_LEAVE:
+                last[player] = leave
+            else:
+                last.pop(player, None)
+
+def features(np, counts):
+    """
+    Returns the feature rows of a batch of leaves, given as an array of
+    their tile counts with a row per leave.
+    """
+    vowel_slots = [TILE_SLOTS[letter] for letter in VOWELS]
+    consonant_slots = [slot for slot in range(len(TILES) - 1)
+                       if TILES[slot] not in VOWELS]
+    counts = counts.astype(np.float64)
+    vowels = counts[:, vowel_slots].sum(axis=1)
+    consonants = counts[:, consonant_slots].sum(axis=1)
+    q_without_u = (counts[:, TILE_SLOTS['q']] > 0) & (counts[:, TILE_SLOTS['u']] == 0)
+    return np.column_stack((
+        np.ones(len(counts)),
+        counts,
+        np.maximum(counts - 1, 0),
+        np.abs(vowels - consonants),
+        q_without_u,
+    ))
+
+def fit(paths, batch_size=BATCH_SIZE, ridge=RIDGE):
+    """
+    Returns the fitted feature weights and the number of samples, from the
+    move logs at `paths`.
+    """
+    np = _numpy()
+    xtx = np.zeros((NUM_FEATURES, NUM_FEATURES))
+    xty = np.zeros(NUM_FEATURES)
+    counts = np.zeros((batch_size, len(TILES)), dtype=np.uint8)
+    scores = np.zeros(batch_size)
+    samples = 0
+    filled = 0
+
+    def add_batch(rows):
+        x = features(np, counts[:rows])
+        xtx[...] += x.T @ x
+        xty[...] += x.T @ scores[:rows]
+
+    for path in paths:
+        for leave, score in iter_samples(iter_log(path)):
+            row = counts[filled]
+            row[:] = 0
+            for letter in leave:
+                row[TILE_SLOTS[letter]] += 1
+            scores[filled] = score
+            filled += 1
+            if filled == batch_size:
+                add_batch(filled)
+                samples += filled
+                filled = 0
+    if filled:
+        add_batch(filled)
+        samples += filled
+
+    # No penalty on the intercept
+    penalty = ridge*np.eye(NUM_FEATURES)
+    penalty[0, 0] = 0
+    weights = np.linalg.solve(xtx + penalty, xty)
+    return weights, samples
+
+def fitted_table(weights, batch_size=BATCH_SIZE):
+    """
+    Returns a LeaveTable of the fitted value of every leave, leaving out
+    the intercept.
+    """
+    np = _numpy()
+    values = array.array('f')
+    counts = np.zeros((batch_size, len(TILES)), dtype=np.uint8)
+    filled = 0
+    for leave in iter_leaves():
+        counts[filled] = leave
+        filled += 1
+        if filled == batch_size:
+            values.frombytes((features(np, counts) @ weights - weights[0]).astype(np.float32).tobytes())
+            filled = 0
+    if filled:
+        values.frombytes((features(np, counts[:filled]) @ weights - weights[0]).astype(np.float32).tobytes())
+    return LeaveTable(values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fits leave values to self-play move logs.')
+    parser.add_argument('output', help='leave table to write')
+    parser.add_argument('logs', nargs='+', help='move logs from selfplay --log')
+    parser.add_argument('--batch', type=int, default=BATCH_SIZE)
+    parser.add_argument('--ridge', type=float, default=RIDGE)
+    args = parser.parse_args()
+
+    weights, samples = fit(args.logs, args.batch, args.ridge)
+    write_table(args.output, fitted_table(weights, args.batch))
+    print('Fitted %d samples, average next score %.1f' % (samples, weights[0]))
+    for tile in TILES:
+        print('%s %+.2f' % (tile if tile != BLANK else '?', weights[1 + TILE_SLOTS[tile]]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Rack leave values, for equity-based move selection.
+
+A leave is what stays on the rack after a move: up to MAX_LEAVE tiles,
+with no more of a tile than the game has. Leaves are ranked from 0 to
+NUM_LEAVES - 1 in lexicographic order of their tile counts, indexed by
+TILES slot, and the rank of a leave is a sum of precomputed offsets, one
+per tile kind in it. A LeaveTable holds the value of every leave as a
+packed float array indexed by rank, and is called with a leave's tile
+counts like the leave value functions of bots.
+
+Tables are saved with twl.write_sections, as a header of TABLE_OFFSET
+bytes followed by NUM_LEAVES little-endian 32 bit floats. load_table
+memory-maps the file so processes using the same table share its pages.
+The values can also be read with
+numpy.fromfile(path, '<f4', offset=TABLE_OFFSET).
+
+    python leaves.py heuristic.leaves
+"""
+import array
+import hashlib
+import sys
+
+from constants import *
+from scrabble import TILES
+import twl
+
+
+# Most tiles a leave can have, a move uses at least one of the seven
+MAX_LEAVE = 6
+
+TABLE_MAGIC = b'LEAV'
+TABLE_VERSION = 2
+# Where the values start in a table file
+TABLE_OFFSET = twl.sections_header(1).size
+
+
+def _rank_tables():
+    """
+    Returns the rank offsets of each (slot, tiles left, count) and the
+    number of leaves.
+    """
+    caps = [min(LETTERS_FREQS[tile], MAX_LEAVE) for tile in TILES]
+    # completions[slot][left]: how many ways slots from `slot` on can hold
+    # up to `left` tiles
+    completions = [[1]*(MAX_LEAVE + 1)]
+    for slot in reversed(range(len(TILES))):
+        after = completions[0]
+        completions.insert(0, [
+            sum(after[left - count] for count in range(min(caps[slot], left) + 1))
+            for left in range(MAX_LEAVE + 1)])
+
+    # Leaves with `count` of a slot come after those with fewer
+    offsets = [0]*(len(TILES)*(MAX_LEAVE + 1)*(MAX_LEAVE + 1))
+    for slot in range(len(TILES)):
+        after = completions[slot + 1]
+        for left in range(MAX_LEAVE + 1):
+            base = (slot*(MAX_LEAVE + 1) + left)*(MAX_LEAVE + 1)
+            offset = 0
+            for count in range(min(caps[slot], left) + 1):
+                offsets[base + count] = offset
+                offset += after[left - count]
+    return offsets, completions[0][MAX_LEAVE]
+
+_OFFSETS, NUM_LEAVES = _rank_tables()
+
+# Identifies the ranking, so tables for other leaves are not loaded
+_LAYOUT_DIGEST = hashlib.sha1(repr(
+    (MAX_LEAVE, [(tile, LETTERS_FREQS[tile]) for tile in TILES])).encode('ascii')).digest()
+
+
+def leave_rank(counts):
+    """
+    Returns the rank of a leave from its tile counts, indexed by TILES
+    slot.
+    """
+    rank = 0
+    left = MAX_LEAVE
+    for slot, count in enumerate(counts):
+        if count:
+            rank += _OFFSETS[(slot*(MAX_LEAVE + 1) + left)*(MAX_LEAVE + 1) + count]
+            left -= count
+    return rank
+
+def iter_leaves():
+    """
+    Yields the tile counts of every leave, in rank order. The same list is
+    yielded each time, updated in place.
+    """
+    caps = [min(LETTERS_FREQS[tile], MAX_LEAVE) for tile in TILES]
+    counts = [0]*len(TILES)
+    while True:
+        yield counts
+        # The next leave adds a tile to the last slot that can take one,
+        # emptying the slots after it
+        total = sum(counts)
+        for slot in reversed(range(len(TILES))):
+            if counts[slot] < caps[slot] and total < MAX_LEAVE:
+                counts[slot] += 1
+                break
+            total -= counts[slot]
+            counts[slot] = 0
+        else:
+            return
+
+
+class LeaveTable():
+    """
+    Values of every leave, indexed by leave_rank. Called with a leave's
+    tile counts, returns its value.
+    """
+    def __init__(self, values, path=None):
+        if len(values) != NUM_LEAVES:
+            raise ValueError('A leave table has %d values, not %d' % (NUM_LEAVES, len(values)))
+        self.values = values
+        # File the values are mapped from, reopened when unpickled
+        self.path = path
+
+    def __call__(self, counts):
+        return self.values[leave_rank(counts)]
+
+    def __reduce__(self):
+        if self.path is not None:
+            return (load_table, (self.path,))
+        return (LeaveTable, (array.array('f', self.values),))
+
+
+def build_table(leave_value):
+    """
+    Returns a LeaveTable of `leave_value`, a function of a leave's tile
+    counts, for every leave.
+    """
+    return LeaveTable(array.array('f', (leave_value(counts) for counts in iter_leaves())))
+
+def write_table(path, table):
+    """
+    Writes a LeaveTable to `path`, see twl.write_sections.
+    """
+    twl.write_sections(path, TABLE_MAGIC, TABLE_VERSION, _LAYOUT_DIGEST,
+                       [(table.values, 'f')])
+
+def load_table(path):
+    """
+    Memory-maps a leave table written by write_table. Raises ValueError if
+    the file is not a table of these leaves or fails its checksum.
+    """
+    (values,), mapped = twl.read_sections(
+        path, TABLE_MAGIC, TABLE_VERSION, _LAYOUT_DIGEST, ['f'])
+    table = LeaveTable(values, path)
+    table.mapped = mapped
+    return table
+
+
+def main():
+    from bots import heuristic_leave
+
+    if len(sys.argv) != 2:
+        print('Usage: python leaves.py OUTPUT')
+        sys.exit(1)
+    write_table(sys.argv[1], build_table(heuristic_leave))
+    print('Wrote %d leave values to %s' % (NUM_LEAVES, sys.argv[1]))
+
+
+if __name__ == '__main__':
+    main()
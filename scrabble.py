@@ -1,21 +1,157 @@
-from random import shuffle
+from random import Random
+from string import ascii_letters
+import time
 
 from constants import *
 import twl
 
 
+# Board value of an empty square
+EMPTY = 0
+
+# Bitboards have bit row*15 + col set for each square in them
+BOARD_MASK = (1 << 225) - 1
+ROW_MASKS = [((1 << 15) - 1) << (15*row) for row in range(15)]
+COL_MASKS = [sum(1 << (15*row + col) for row in range(15)) for col in range(15)]
+STAR_BIT = 1 << (7*15 + 7)
+
+def neighbour_bits(bits):
+    """
+    Returns the bitboard of the squares above, below, left and right of
+    the squares in `bits`.
+    """
+    left = (bits & ~COL_MASKS[0]) >> 1
+    right = (bits & ~COL_MASKS[14]) << 1
+    return (left | right | (bits << 15) | (bits >> 15)) & BOARD_MASK
+
+def lowest_square(bits):
+    """
+    Returns the index (row*15 + col) of the lowest square in `bits`.
+    """
+    return (bits & -bits).bit_length() - 1
+
+# Directions of play, indexing Scrabble._cross_checks
+ACROSS = 0
+DOWN = 1
+
+# Slots of the tile count arrays of the rack and bag, a to z then the
+# blank. Letters share their slot with twl.
+TILES = twl.ALPHABET + BLANK
+TILE_SLOTS = dict((tile, i) for i, tile in enumerate(TILES))
+BLANK_SLOT = TILE_SLOTS[BLANK]
+
+# Zobrist keys for Scrabble.position_hash. The generator is seeded so
+# hashes are the same in every process.
+_zobrist = Random(0x5c7ab)
+# Key of each letter on each square, uppercase letters being blanks
+SQUARE_KEYS = {letter: [_zobrist.getrandbits(64) for _ in range(225)]
+               for letter in ascii_letters}
+# Key of the n-th copy of each tile on the rack
+RACK_KEYS = {letter: [_zobrist.getrandbits(64) for _ in range(freq)]
+             for letter, freq in LETTERS_FREQS.items()}
+# Key of the player to move, none for the first player
+SEAT_KEYS = [0] + [_zobrist.getrandbits(64) for _ in range(MAX_PLAYERS - 1)]
+
+# Marks the seat changes of Scrabble.next_player in the undo history
+NEXT_PLAYER = 'next_player'
+
+# Search steps of generate_moves between two looks at the clock
+DEADLINE_STEPS = 64
+
+class _SearchClock():
+    """
+    Deadline of one generate_moves call. Counts the search steps and looks
+    at the clock every DEADLINE_STEPS of them.
+    """
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.steps = 0
+        self.out_of_time = False
+
+    def expired(self):
+        """
+        Counts a search step, and returns True once the deadline has
+        passed, which unwinds the search.
+        """
+        if not self.out_of_time:
+            self.steps += 1
+            if self.steps % DEADLINE_STEPS == 0:
+                self.out_of_time = time.perf_counter() > self.deadline
+        return self.out_of_time
+
+
+def rack_hash(counts):
+    """
+    Returns the Zobrist hash of a rack from its tile counts.
+    """
+    ret = 0
+    for slot, count in enumerate(counts):
+        for n in range(count):
+            ret ^= RACK_KEYS[TILES[slot]][n]
+    return ret
+
+def rack_letter(letter):
+    """
+    Returns the rack tile a placed letter comes from: a blank for the
+    uppercase letters blanks are played as, the letter itself otherwise.
+    """
+    return BLANK if letter.isupper() else letter
+
+def letter_bit(letter):
+    """
+    Returns the twl mask bit of a placed letter, 0 for an unassigned
+    blank.
+    """
+    letter = letter.lower()
+    if letter in twl.LETTER_SLOTS:
+        return twl.letter_bit(letter)
+    return 0
+
+def letter_score(letter):
+    """
+    Returns the face value of a placed letter. Blanks score nothing.
+    """
+    return LETTER_SCORE[rack_letter(letter)]
+
+
 class Scrabble():
-    def __init__(self, debug):
+    def __init__(self, debug, players=1, seed=None):
+        if not 1 <= players <= MAX_PLAYERS:
+            raise ValueError('A game has 1 to %d players' % MAX_PLAYERS)
+
         self.debug = debug
+        # Draws come from a generator of their own so that a game can be
+        # replayed from its seed
+        self._random = Random(seed)
         self._populate_bag()
-        self.shuffle_bag()
-        self._board = [
-            [None]*15 for _ in range(15)
-        ]
+        # Flat boards of letter codes, EMPTY for an empty square. The
+        # transposed copy is indexed col*15 + row so columns are slices too.
+        self._board = bytearray(225)
+        self._board_t = bytearray(225)
+        # Occupancy bitboard, bit row*15 + col set for each tile
+        self._occupied = 0
         self._move_count = 0
-        self._player_rack = []
-        self._draw_tiles(7)
+        # Moves made with play(), exchanges and seat changes, for undo()
+        self._history = []
+        self._reset_cross_checks()
+        self._reset_anchors()
+        # Zobrist hash of the position, 0 for an empty board and rack
+        self._hash = 0
+        # The rack lists are kept in draw order for the UI, with the count
+        # of each tile in its slot of the rack counts. _player_rack,
+        # _rack_counts and _player_score are those of the player to move.
+        self._racks = [[] for _ in range(players)]
+        self._racks_counts = [[0]*len(TILES) for _ in range(players)]
+        self._scores = [0]*players
+        for player in range(players):
+            self._player_rack = self._racks[player]
+            self._rack_counts = self._racks_counts[player]
+            self._draw_tiles(7)
+        self._player = 0
+        self._player_rack = self._racks[0]
+        self._rack_counts = self._racks_counts[0]
         self._player_score = 0
+        self._hash = rack_hash(self._rack_counts)
 
     def _print_board(self):
         """
@@ -23,39 +159,69 @@ class Scrabble():
         """
         for i in range(15):
             for j in range(15):
-                if self._board[i][j] == None:
+                tile = self._tile(i, j)
+                if tile == None:
                     print('_', end='')
-                elif self._board[i][j] == ' ':
+                elif tile == ' ':
                     print('-', end='')
                 else:
-                    print(self._board[i][j], end='')
+                    print(tile, end='')
             print('')
 
         print('Rack:', ' '.join(self._player_rack))
 
     def _populate_bag(self):
         """
-        Fills the bag with the starting letter frequencies.
+        Fills the bag with the starting letter frequencies. The bag list is
+        in no particular order, tiles are drawn from it at random.
         """
         self._bag = []
+        self._bag_counts = [0]*len(TILES)
         for letter in LETTERS_FREQS:
             for _ in range(LETTERS_FREQS[letter]):
                 self._bag.append(letter)
+            self._bag_counts[TILE_SLOTS[letter]] = LETTERS_FREQS[letter]
 
     def shuffle_bag(self):
         """
         Randomizes the contents of the bag.
         """
-        shuffle(self._bag)
+        self._random.shuffle(self._bag)
 
     def _draw_tiles(self, amount):
         """
         Removes the specified number of tiles from the bag and puts them into
-        the player rack.
+        the player rack. Each tile is picked at a random index of the bag and
+        swapped with the last one before it is removed. Returns the
+        (index, letter) of each tile drawn.
         """
+        bag = self._bag
+        drawn = []
         for _ in range(amount):
-            if len(self._bag) > 0:
-                self._player_rack.append(self._bag.pop())
+            if len(bag) > 0:
+                index = self._random.randrange(len(bag))
+                letter = bag[index]
+                bag[index] = bag[-1]
+                bag.pop()
+                slot = TILE_SLOTS[letter]
+                self._bag_counts[slot] -= 1
+                self._hash ^= RACK_KEYS[letter][self._rack_counts[slot]]
+                self._rack_counts[slot] += 1
+                self._player_rack.append(letter)
+                drawn.append((index, letter))
+        return drawn
+
+    def _return_tiles(self, drawn):
+        """
+        Puts tiles drawn by _draw_tiles back into the bag where they came
+        from, undoing the draws in reverse order. The tiles must already be
+        off the rack.
+        """
+        bag = self._bag
+        for index, letter in reversed(drawn):
+            bag.append(letter)
+            bag[index], bag[-1] = letter, bag[index]
+            self._bag_counts[TILE_SLOTS[letter]] += 1
 
     def num_remaining_tiles(self):
         """
@@ -63,181 +229,386 @@ class Scrabble():
         """
         return len(self._bag)
 
-    def get_rack(self):
+    def get_rack(self, player=None):
+        """
+        Returns a copy of a player's rack, the player to move by default.
+        """
+        if player is None:
+            player = self._player
+        return self._racks[player][:]
+
+    def get_scores(self):
+        """
+        Returns the score of each player.
+        """
+        self._scores[self._player] = self._player_score
+        return self._scores[:]
+
+    def current_player(self):
         """
-        Returns a copy of the player's rack
+        Returns the index of the player to move.
         """
-        return self._player_rack[:]
+        return self._player
+
+    def next_player(self):
+        """
+        Passes the turn to the next player, whose rack and score become
+        the current ones. The seat change can be taken back with undo().
+        """
+        # A seat change is recorded as the seat left, and no tiles
+        self._history.append((self._player, NEXT_PLAYER))
+        self._take_seat((self._player + 1) % len(self._racks))
+
+    def _take_seat(self, player):
+        """
+        Makes `player` the player to move.
+        """
+        self._scores[self._player] = self._player_score
+        self._hash ^= rack_hash(self._rack_counts) ^ SEAT_KEYS[self._player]
+        self._player = player
+        self._player_rack = self._racks[self._player]
+        self._rack_counts = self._racks_counts[self._player]
+        self._player_score = self._scores[self._player]
+        self._hash ^= rack_hash(self._rack_counts) ^ SEAT_KEYS[self._player]
+
+    def unseen_count(self, letter):
+        """
+        Returns how many of a tile (a letter, or a blank) the player to
+        move has not seen, in the bag or on the other players' racks.
+        """
+        slot = TILE_SLOTS[letter]
+        ret = self._bag_counts[slot]
+        for counts in self._racks_counts:
+            ret += counts[slot]
+        return ret - self._rack_counts[slot]
+
+    def unseen_tiles(self):
+        """
+        Returns the count of each tile the player to move has not seen,
+        indexed by TILE_SLOTS.
+        """
+        ret = self._bag_counts[:]
+        for counts in self._racks_counts:
+            if counts is not self._rack_counts:
+                for slot, count in enumerate(counts):
+                    ret[slot] += count
+        return ret
+
+    def position_hash(self):
+        """
+        Returns the Zobrist hash of the position: the letters on the board,
+        and the rack and seat of the player to move. Positions reached by
+        different turns hash the same.
+        """
+        return self._hash
 
     def exchange_tiles(self, old):
         """
         Returns the old tiles to the bag and draws an equal number to replace
-        them.
+        them. Returns True if the tiles were exchanged. The exchange can be
+        taken back with undo().
         """
         # Only can return letters from the player's rack
         if self._all_letters_from_rack(old):
             # Make sure there is enough letters to exchange
             if len(old) > len(self._bag):
-                return
+                return False
 
+            position_hash = self._hash
             # Add the new tiles to the rack
-            self._draw_tiles(len(old))
+            drawn = self._draw_tiles(len(old))
 
-            # Remove the old from the rack and add them to the bad
+            # Remove the old from the rack and add them to the bad. The
+            # drawn tiles come after the old ones, so stay at the end.
+            removed = []
             for letter in old:
-                self._player_rack.remove(letter)
+                slot = TILE_SLOTS[letter]
+                index = self._player_rack.index(letter)
+                del self._player_rack[index]
+                self._rack_counts[slot] -= 1
+                self._hash ^= RACK_KEYS[letter][self._rack_counts[slot]]
                 self._bag.append(letter)
+                self._bag_counts[slot] += 1
+                removed.append((index, letter))
+
+            # No tiles placed marks an exchange
+            self._history.append((self._player, None, removed, drawn, position_hash))
+            return True
 
-            self.shuffle_bag()
+        return False
 
     def submit_turn(self, tiles):
         """
         Given a list of tiles (i, j, letter), check if valid, place on to board
         and add to player score.
         """
-        if self._is_valid_move(tiles):
-            self._score_turn(tiles)
-            self._place_move(tiles)
-            self._update_player_rack(tiles)
-            return True
-        else:
+        return self.play(tiles)
+
+    def play(self, tiles):
+        """
+        Same as submit_turn, but only records what changed so that undo()
+        can take the move back without copying the game.
+        """
+        if not self._is_valid_move(tiles):
             return False
 
+        score = self._player_score
+        position_hash = self._hash
+        self._score_turn(tiles)
+        cross_changes, anchors_removed, anchors_added = self._place_move(tiles)
+        removed, drawn = self._update_player_rack(tiles)
+        self._history.append((
+            self._player, tiles, cross_changes, anchors_removed, anchors_added, removed,
+            drawn, self._player_score - score, position_hash,
+        ))
+        return True
+
+    def undo(self):
+        """
+        Takes back the last turn. If the turn was passed on with
+        next_player, the seat goes back to the player who passed it.
+        Then, if that player's last move was made with play or
+        submit_turn, the tiles go back from the board to the rack, the
+        tiles drawn go back into the bag, and the score and move count
+        are restored. An exchange made with exchange_tiles is taken back
+        the same way. Returns False if there is nothing to take back.
+        """
+        if not self._history:
+            return False
+
+        if self._history[-1][1] is NEXT_PLAYER:
+            self._take_seat(self._history.pop()[0])
+            if (not self._history or self._history[-1][1] is NEXT_PLAYER
+                    or self._history[-1][0] != self._player):
+                return True
+        elif self._history[-1][0] != self._player:
+            return False
+
+        if self._history[-1][1] is None:
+            self._undo_exchange()
+            return True
+
+        (_, tiles, cross_changes, anchors_removed, anchors_added, removed,
+         drawn, score, position_hash) = self._history.pop()
+
+        # Drawn tiles are at the end of the rack
+        del self._player_rack[len(self._player_rack) - len(drawn):]
+        for _, letter in drawn:
+            self._rack_counts[TILE_SLOTS[letter]] -= 1
+        self._return_tiles(drawn)
+        for index, letter in reversed(removed):
+            self._player_rack.insert(index, letter)
+            self._rack_counts[TILE_SLOTS[letter]] += 1
+
+        self._player_score -= score
+        self._move_count -= 1
+        for row, col, _ in tiles:
+            self._board[row*15 + col] = EMPTY
+            self._board_t[col*15 + row] = EMPTY
+            self._occupied &= ~(1 << (row*15 + col))
+        for direction, line, pos, check in reversed(cross_changes):
+            self._cross_checks[direction][line][pos] = check
+        self._anchors -= anchors_added
+        self._anchors |= anchors_removed
+        self._hash = position_hash
+        return True
+
+    def _undo_exchange(self):
+        """
+        Takes back the exchange at the top of the history.
+        """
+        _, _, removed, drawn, position_hash = self._history.pop()
+
+        # The returned tiles are at the end of the bag
+        del self._bag[len(self._bag) - len(removed):]
+        for index, letter in reversed(removed):
+            self._bag_counts[TILE_SLOTS[letter]] -= 1
+            self._player_rack.insert(index, letter)
+            self._rack_counts[TILE_SLOTS[letter]] += 1
+
+        # Drawn tiles are at the end of the rack
+        del self._player_rack[len(self._player_rack) - len(drawn):]
+        for _, letter in drawn:
+            self._rack_counts[TILE_SLOTS[letter]] -= 1
+        self._return_tiles(drawn)
+        self._hash = position_hash
+
     def _is_valid_move(self, tiles):
         """
         Returns True if the list of tiles forms valid words and are placed
-        in a correct manner.
+        in a correct manner. The placement is checked on bitboards first,
+        so obviously illegal moves are rejected before any word lookup.
         """
-        rows = []
-        cols = []
-        letters = []
-
-        for row, col, letter in tiles:
-            rows.append(row)
-            cols.append(col)
-            letters.append(letter)
+        letters = [letter for _, _, letter in tiles]
 
         # Reset score accumulation
         self._turn_score = 0
 
         return (
+            self._is_valid_placement(tiles) and
             self._all_letters_from_rack(letters) and
-            self._is_colinear(rows, cols) and
-            self._all_unique_places(rows, cols) and
-            self._is_contiguous(rows, cols) and
-            self._touches_others(rows, cols) and
             self._all_vaild_words(tiles)
         )
 
+    def score_move(self, tiles):
+        """
+        Scores the list of tiles (row, col, letter) without changing the
+        game, so it can be called for any number of candidate moves.
+
+        Returns (total, words, bingo), where words is a list of (word,
+        score) for each word formed and bingo is the bonus for playing
+        seven tiles, or None if the tiles are not a legal placement or
+        form an invalid word. Does not check the tiles are on the
+        player's rack.
+        """
+        if not self._is_valid_placement(tiles):
+            return None
+
+        words = self._formed_words(tiles)
+        if words is None:
+            return None
+
+        bingo = BINGO_BONUS if len(tiles) == 7 else 0
+        total = sum(score for _, score in words) + bingo
+        return total, words, bingo
+
+    def _is_valid_placement(self, tiles):
+        """
+        Returns True if the tiles are placed in a correct manner, using
+        only the bitboards.
+        """
+        if not tiles:
+            return False
+
+        rows = []
+        cols = []
+        placed = 0
+
+        for row, col, _ in tiles:
+            rows.append(row)
+            cols.append(col)
+            placed |= 1 << (row*15 + col)
+
+        return (
+            self._all_unique_places(rows, cols, placed) and
+            self._all_empty_places(placed) and
+            self._is_colinear(placed) and
+            self._is_contiguous(placed) and
+            self._touches_others(placed)
+        )
+
     def _all_letters_from_rack(self, letters):
         """
-        Determines if all letters are present in the player's rack.
+        Determines if all letters are present in the player's rack. The
+        rack counts are taken down as letters are found, then put back.
         """
-        rack = self._player_rack[:]
+        counts = self._rack_counts
+        ret = True
+        taken = 0
         for letter in letters:
-            if letter in rack:
-                rack.remove(letter)
-            else:
-                if self.debug:
-                    print("Validation: Not all letters are from the rack")
-                return False
+            slot = TILE_SLOTS.get(rack_letter(letter))
+            if slot is None or counts[slot] == 0:
+                ret = False
+                break
+            counts[slot] -= 1
+            taken += 1
 
-        # All letters were in the rack
-        return True
+        for i in range(taken):
+            counts[TILE_SLOTS[rack_letter(letters[i])]] += 1
 
-    def _is_colinear(self, rows, cols):
+        if self.debug and ret == False:
+            print("Validation: Not all letters are from the rack")
+
+        return ret
+
+    def _is_colinear(self, placed):
         """
-        True if all rows are equal or all cols are equal.
+        True if all tiles are in the same row or in the same column.
         """
-        ret = len(set(rows)) == 1 or len(set(cols)) == 1
+        first = lowest_square(placed)
+        ret = (placed & ~ROW_MASKS[first // 15] == 0 or
+               placed & ~COL_MASKS[first % 15] == 0)
         if self.debug and ret == False:
             print("Validation: Tiles are not colinear")
 
         return ret
 
-    def _all_unique_places(self, rows, cols):
+    def _all_unique_places(self, rows, cols, placed):
         """
         Cannot have duplicate places
         """
-        places = list(zip(rows, cols))
-        ret = len(set(places)) == len(places)
+        ret = bin(placed).count('1') == len(rows)
         if self.debug and ret == False:
             print("Validation: Tiles are not uniquely placed")
-            print(places)
+            print(list(zip(rows, cols)))
         return ret
 
-    def _is_contiguous(self, rows, cols):
+    def _all_empty_places(self, placed):
         """
-        Tiles must be in a contiguous line with existing tiles, if needed.
+        Cannot place tiles on top of existing ones.
         """
-        # Case: Only one tile
-        if len(cols) == len(rows) == 1:
-            return True
-
-        is_vertical = len(set(cols)) == 1
-
-        if is_vertical:
-            start = min(rows)
-            end = max(rows)
-            col = cols[0]
-
-            for row in range(start, end):
-                if row not in rows and self._board[row][col] == None:
-                    if self.debug:
-                        print("Validation: Tiles are not contiguous")
-                    return False
+        ret = placed & self._occupied == 0
+        if self.debug and ret == False:
+            print("Validation: Tiles placed on existing tiles")
+        return ret
 
-        else:
-            start = min(cols)
-            end = max(cols)
-            row = rows[0]
+    def _is_contiguous(self, placed):
+        """
+        Tiles must be in a contiguous line with existing tiles, if needed.
+        Assumes tiles are colinear.
+        """
+        first = lowest_square(placed)
+        last = placed.bit_length() - 1
 
-            for col in range(start, end):
-                if col not in cols and self._board[row][col] == None:
-                    if self.debug:
-                        print("Validation: Tiles are not contiguous")
-                    return False
+        # Squares from the first to the last tile, along the line of play
+        span = (1 << (last + 1)) - (1 << first)
+        if placed & ~ROW_MASKS[first // 15]:
+            span &= COL_MASKS[first % 15]
 
-        return True
+        ret = span & ~(placed | self._occupied) == 0
+        if self.debug and ret == False:
+            print("Validation: Tiles are not contiguous")
+        return ret
 
-    def _touches_others(self, rows, cols):
+    def _touches_others(self, placed):
         """
         Word being played must touch existing tiles, or first move must start
         in the middle of the board.
         """
-        places = list(zip(rows, cols))
-
         if self._move_count == 0:
-            ret = (7, 7) in places
+            ret = placed & STAR_BIT != 0
             if self.debug and ret == False:
                 print("Validation: First move wasn't on star")
             return ret
-        else:
-            for row, col in places:
-                # Above
-                if row > 0 and self._board[row - 1][col] is not None:
-                    return True
-                # Below
-                if row < 14 and self._board[row + 1][col] is not None:
-                    return True
-                # Left
-                if col > 0 and self._board[row][col - 1] is not None:
-                    return True
-                # Right
-                if col < 14 and self._board[row][col + 1] is not None:
-                    return True
-
-            # Made it through each tile without touching, invalid
-            if self.debug:
-                print("Validation: Tiles do not touch existing tiles")
-            return False
+
+        ret = placed & neighbour_bits(self._occupied) != 0
+        if self.debug and ret == False:
+            print("Validation: Tiles do not touch existing tiles")
+        return ret
 
     def _all_vaild_words(self, tiles):
         """
         Determines if all the words formed are valid.
         Accumulates the score for valid words
+        """
+        words = self._formed_words(tiles, False)
+        if words is None:
+            return False
+
+        for _, score in words:
+            self._turn_score += score
+        return True
+
+    def _formed_words(self, tiles, texts=True):
+        """
+        Returns a list of (word, score) for the words formed by the
+        tiles, or None if any of them is invalid.
         Assumes tiles are colinear and contiguous.
+        Words across the line of play are checked and scored from the
+        cross-check tables. Their text is only read from the board if
+        `texts` is True, or for debug output, otherwise it is None.
         """
+        words = []
         rows = []
         cols = []
         letters = {}
@@ -246,182 +617,291 @@ class Scrabble():
             cols.append(col)
             letters[(row, col)] = letter
 
-        is_vertical = len(set(cols)) == 1
-
-        if is_vertical:  # Also true if only one tile was placed
+        is_vertical = len(set(cols)) == 1  # Also true for a single tile
+        if is_vertical:
+            line = cols[0]
             start = min(rows)
             end = max(rows)
-            col = cols[0]
-
-            # Start may be extened by existing tiles
-            for row in range(start - 1, -1, -1):
-                if self._board[row][col] is not None:
-                    start = row
-                else:
-                    # Found first open place, quit
-                    break
-            # Same for the end
-            for row in range(end + 1, 15):
-                if self._board[row][col] is not None:
-                    end = row
-                else:
-                    # Found first open place, quit
-                    break
-
-            # If only one tile was played, there may not be a vertical word
-            if start != end:
-                # Check the word that was made vertically
-                word = ''
-                for row in range(start, end + 1):
-                    word += letters.get((row, col), self._board[row][col])
-                if not self._is_valid_word(word):
-                    if self.debug:
-                        print("Validation: Invalid word:", word)
-                    return False
-
-                self._score_word((start, col), (end, col), letters)
-
-            # Check all horizontal words made from each of the new tiles
-            for row, col, _ in tiles:
-                start_h = col
-                end_h = col
-
-                # Start may be extened by existing tiles
-                for col_h in range(start_h - 1, -1, -1):
-                    if self._board[row][col_h] is not None:
-                        start_h = col_h
-                    else:
-                        # Found first open place, quit
-                        break
-                # Same for the end
-                for col_h in range(end_h + 1, 15):
-                    if self._board[row][col_h] is not None:
-                        end_h = col_h
-                    else:
-                        # Found first open place, quit
-                        break
-
-                # No word made horizontally
-                if start_h == end_h:
-                    # Issue if only one tile was placed on start
-                    if len(tiles) == 1:
-                        if self.debug:
-                            print("Validation: Only placed one tile on start")
-                        return False
-                    continue
-
-                # Make and check word
-                word = ''
-                for col_h in range(start_h, end_h + 1):
-                    word += letters.get((row, col_h), self._board[row][col_h])
-                if not self._is_valid_word(word):
-                    if self.debug:
-                        print("Validation: Invalid word:", word)
-                    return False
-
-                self._score_word((row, start_h), (row, end_h), letters)
-
-        else:  # is horizontal
+        else:
+            line = rows[0]
             start = min(cols)
             end = max(cols)
-            row = rows[0]
-
-            # Start may be extened by existing tiles
-            for col in range(start - 1, -1, -1):
-                if self._board[row][col] is not None:
-                    start = col
-                else:
-                    # Found first open place, quit
-                    break
-            # Same for the end
-            for col in range(end + 1, 15):
-                if self._board[row][col] is not None:
-                    end = col
-                else:
-                    # Found first open place, quit
-                    break
 
+        # Start and end may be extened by existing tiles
+        squares = self._line(line, is_vertical)
+        while start > 0 and squares[start - 1] != EMPTY:
+            start -= 1
+        while end < 14 and squares[end + 1] != EMPTY:
+            end += 1
 
-            # Check the word that was made horizontally
+        # If only one tile was played, there may not be a word along the line
+        made_word = start != end
+        if made_word:
             word = ''
-            for col in range(start, end + 1):
-                word += letters.get((row, col), self._board[row][col])
+            for pos in range(start, end + 1):
+                square = (pos, line) if is_vertical else (line, pos)
+                word += letters.get(square) or chr(squares[pos])
             if not self._is_valid_word(word):
                 if self.debug:
                     print("Validation: Invalid word:", word)
-                return False
-
-            self._score_word((row, start), (row, end), letters)
-
-            # Check all vertical words made from each of the new tiles
-            for row, col, _ in tiles:
-                start_v = row
-                end_v = row
-
-                # Start may be extened by existing tiles
-                for row_v in range(start_v - 1, -1, -1):
-                    if self._board[row_v][col] is not None:
-                        start_v = row_v
-                    else:
-                        # Found first open place, quit
-                        break
-                # Same for the end
-                for row_v in range(end_v + 1, 15):
-                    if self._board[row_v][col] is not None:
-                        end_v = row_v
-                    else:
-                        # Found first open place, quit
-                        break
+                return None
 
-                # No word made vertically
-                if start_v == end_v:
-                    continue
+            if is_vertical:
+                score = self._score_word((start, line), (end, line), letters)
+            else:
+                score = self._score_word((line, start), (line, end), letters)
+            words.append((word, score))
 
-                # Make and check word
-                word = ''
-                for row_v in range(start_v, end_v + 1):
-                    word += letters.get((row_v, col), self._board[row_v][col])
-                if not self._is_valid_word(word):
-                    if self.debug:
-                        print("Validation: Invalid word:", word)
-                    return False
+        # Check and score the words made across the line by each new tile
+        checks = self._cross_checks[DOWN if is_vertical else ACROSS]
+        for row, col, letter in tiles:
+            check = checks[col][row] if is_vertical else checks[row][col]
+            if check is None:
+                continue
 
-                self._score_word((start_v, col), (end_v, col), letters)
+            made_word = True
+            mask, cross_sum = check
+            if not mask & letter_bit(letter):
+                if self.debug:
+                    before, after = self._cross_parts(row, col, not is_vertical)
+                    print("Validation: Invalid word:", before + letter + after)
+                return None
+
+            value = letter_score(letter)*LETTER_MULTIPLIERS.get((row, col), 1)
+            score = (cross_sum + value)*WORD_MULTIPLIERS.get((row, col), 1)
+            word = None
+            if texts:
+                before, after = self._cross_parts(row, col, not is_vertical)
+                word = before + letter + after
+            words.append((word, score))
+
+        # Issue if a single tile made no word either way, e.g. only one
+        # tile placed on start
+        if not made_word:
+            if self.debug:
+                print("Validation: Only placed one tile on start")
+            return None
 
         # Validated all words
         if self.debug:
             print("All words validated")
-        return True
+        return words
+
+    def _line(self, line, is_vertical):
+        """
+        Returns the letter codes of row `line`, or column `line` if
+        `is_vertical`, as bytes.
+        """
+        board = self._board_t if is_vertical else self._board
+        return board[line*15:line*15 + 15]
+
+    def _tile(self, row, col):
+        """
+        Returns the letter at (row, col), or None if the square is empty.
+        """
+        code = self._board[row*15 + col]
+        return chr(code) if code != EMPTY else None
+
+    def snapshot(self):
+        """
+        Returns a copy of the board as 225 bytes, row by row, with EMPTY
+        for empty squares and the letter code otherwise.
+        """
+        return bytes(self._board)
 
     def _is_valid_word(self, word):
         """
         Uses twl to determine if word is a valid word.
         """
-        ret = twl.check(word)
+        ret = twl.check(word.lower())
         if self.debug:
             print(f"Word '{word}' is valid? {ret}")
-        return twl.check(word)
+        return ret
 
     def _place_move(self, tiles):
         """
-        Given a valid set of tiles, adds them to the board.
+        Given a valid set of tiles, adds them to the board. Returns the
+        cross-check changes and the anchors removed and added, for undo.
         """
         self._move_count += 1
         for row, col, letter in tiles:
-            self._board[row][col] = letter
+            self._board[row*15 + col] = ord(letter)
+            self._board_t[col*15 + row] = ord(letter)
+            self._occupied |= 1 << (row*15 + col)
+            self._hash ^= SQUARE_KEYS[letter][row*15 + col]
+        cross_changes = self._update_cross_checks(tiles)
+        anchors_removed, anchors_added = self._update_anchors(tiles)
+        return cross_changes, anchors_removed, anchors_added
+
+    def anchors(self):
+        """
+        Returns the set of anchor squares (row, col): the empty squares
+        next to a tile, or just the star before the first move. Every
+        move must cover at least one of them.
+        """
+        return set(self._anchors)
+
+    def _reset_anchors(self):
+        """
+        Rebuilds the anchor set from the board.
+        """
+        if self._occupied == 0:
+            self._anchors = {(7, 7)}
+            return
+
+        self._anchors = set()
+        bits = neighbour_bits(self._occupied) & ~self._occupied
+        while bits:
+            square = lowest_square(bits)
+            self._anchors.add(divmod(square, 15))
+            bits &= bits - 1
+
+    def _update_anchors(self, tiles):
+        """
+        Removes the newly occupied squares from the anchor set and adds
+        their empty neighbours. Returns the sets of anchors removed and
+        added.
+        """
+        removed = set()
+        added = set()
+        for row, col, _ in tiles:
+            if (row, col) in self._anchors:
+                self._anchors.remove((row, col))
+                removed.add((row, col))
+            for r, c in ((row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1)):
+                if (0 <= r < 15 and 0 <= c < 15 and self._board[r*15 + c] == EMPTY
+                        and (r, c) not in self._anchors):
+                    self._anchors.add((r, c))
+                    added.add((r, c))
+        return removed, added
+
+    def _reset_cross_checks(self):
+        """
+        Rebuilds the cross-check tables from the board.
+
+        There is a table for plays across and one for plays down, each
+        indexed by [line][position along the line] (so [row][col] across
+        and [col][row] down). An entry is None if the square is occupied
+        or has no tiles beside it across the line of play, otherwise it
+        is (mask, cross_sum): the letters that make a valid word with
+        those tiles, and the face value of the tiles.
+        """
+        self._cross_checks = (
+            [[None]*15 for _ in range(15)],
+            [[None]*15 for _ in range(15)],
+        )
+        for row in range(15):
+            for col in range(15):
+                if self._board[row*15 + col] == EMPTY:
+                    self._cross_checks[ACROSS][row][col] = self._cross_check(row, col, True)
+                    self._cross_checks[DOWN][col][row] = self._cross_check(row, col, False)
+
+    def _update_cross_checks(self, tiles):
+        """
+        Updates the cross-checks of the squares whose words across the
+        line of play changed with the newly placed tiles: the tiles' own
+        squares, and the first empty square past the tiles on the board
+        in each direction from each of them. Returns the changes as a list
+        of (direction, line, pos, previous entry), for undo.
+        """
+        changes = []
+        columns = set()
+        rows = set()
+        for row, col, _ in tiles:
+            changes.append((ACROSS, row, col, self._cross_checks[ACROSS][row][col]))
+            changes.append((DOWN, col, row, self._cross_checks[DOWN][col][row]))
+            self._cross_checks[ACROSS][row][col] = None
+            self._cross_checks[DOWN][col][row] = None
+            for d_row, d_col in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+                r = row + d_row
+                c = col + d_col
+                while 0 <= r < 15 and 0 <= c < 15 and self._board[r*15 + c] != EMPTY:
+                    r += d_row
+                    c += d_col
+                if 0 <= r < 15 and 0 <= c < 15:
+                    if d_row:
+                        columns.add((r, c))
+                    else:
+                        rows.add((r, c))
+
+        for row, col in columns:
+            changes.append((ACROSS, row, col, self._cross_checks[ACROSS][row][col]))
+            self._cross_checks[ACROSS][row][col] = self._cross_check(row, col, True)
+        for row, col in rows:
+            changes.append((DOWN, col, row, self._cross_checks[DOWN][col][row]))
+            self._cross_checks[DOWN][col][row] = self._cross_check(row, col, False)
+        return changes
+
+    def _cross_parts(self, row, col, vertical):
+        """
+        Returns the tiles directly before and after the square at (row,
+        col) as two strings, in its column if `vertical`, else its row.
+        """
+        if vertical:
+            squares = self._line(col, True)
+            pos = row
+        else:
+            squares = self._line(row, False)
+            pos = col
+        start = pos
+        while start > 0 and squares[start - 1] != EMPTY:
+            start -= 1
+        end = pos
+        while end < 14 and squares[end + 1] != EMPTY:
+            end += 1
+        return squares[start:pos].decode(), squares[pos + 1:end + 1].decode()
+
+    def _cross_check(self, row, col, vertical):
+        """
+        Computes the cross-check entry of the empty square at (row, col)
+        for the word in its column if `vertical`, else its row. See
+        _reset_cross_checks.
+        """
+        before, after = self._cross_parts(row, col, vertical)
+        if not before and not after:
+            return None
+
+        cross_sum = sum(letter_score(letter) for letter in before + after)
+        mask = 0
+        cursor = twl.cursor(before.lower())
+        if cursor is not None:
+            after = after.lower()
+            candidates = cursor.child_mask() & twl.ALL_LETTERS_MASK
+            for letter in twl.mask_letters(candidates):
+                cursor.push(letter)
+                pushed = 1
+                for other in after:
+                    if not cursor.push(other):
+                        break
+                    pushed += 1
+                if pushed == len(after) + 1 and cursor.is_word():
+                    mask |= twl.letter_bit(letter)
+                for _ in range(pushed):
+                    cursor.pop()
+        return mask, cross_sum
 
     def _update_player_rack(self, tiles):
         """
         Removed the letters from the player rack and draw new ones.
+        Returns the (index, letter) of each tile removed and of each tile
+        drawn.
         """
+        removed = []
         for _, _, letter in tiles:
-            self._player_rack.remove(letter)
+            letter = rack_letter(letter)
+            slot = TILE_SLOTS[letter]
+            index = self._player_rack.index(letter)
+            del self._player_rack[index]
+            self._rack_counts[slot] -= 1
+            self._hash ^= RACK_KEYS[letter][self._rack_counts[slot]]
+            removed.append((index, letter))
 
-        self._draw_tiles(len(tiles))
+        drawn = self._draw_tiles(len(tiles))
+        return removed, drawn
 
     def _score_word(self, start, end, letters):
         """
-        Adds the score of the valid word between start and end.
+        Returns the score of the valid word between start and end.
         """
         score = 0
         multiplier = 1
@@ -430,27 +910,212 @@ class Scrabble():
                 if (row, col) in letters:
                     # Check for score modifiers
                     multiplier *= WORD_MULTIPLIERS.get((row, col), 1)
-                    score += LETTER_SCORE[letters[(row, col)]]*LETTER_MULTIPLIERS.get((row, col), 1)
+                    score += letter_score(letters[(row, col)])*LETTER_MULTIPLIERS.get((row, col), 1)
                 else:
                     # Tile must be on board, add it's value
-                    score += LETTER_SCORE[self._board[row][col]]
+                    score += letter_score(self._tile(row, col))
 
-        self._turn_score += score*multiplier
+        return score*multiplier
 
     def _score_turn(self, tiles):
         """
         Applies the score of the last validated move to the player score.
         """
-        self._player_score = self._turn_score
+        self._player_score += self._turn_score
         # Check for Bingo
         if len(tiles) == 7:
-            self._player_score += 50
+            self._player_score += BINGO_BONUS
         # Reset turn score counter
         self._turn_score = 0
 
         if self.debug:
             print("Score:", self._player_score)
 
+    def generate_moves(self, rack=None, deadline=None):
+        """
+        Returns every legal move for `rack` (the player's rack by
+        default) as a list of (tiles, score) pairs, highest score first.
+        `tiles` is a list of (row, col, letter) ready for submit_turn.
+        Blanks are played as uppercase letters. If a `deadline` (a
+        time.perf_counter() value) is given, the search looks at the clock
+        every DEADLINE_STEPS steps, stops once the deadline has passed,
+        and only the moves found so far are returned.
+
+        Moves are found per row and per column from the anchor squares
+        (empty squares next to a tile, or the star on the first move):
+        a left part is built from the rack, or taken from the tiles
+        already left of the anchor, and extended rightwards through the
+        DAWG, restricted by each square's cross-check.
+        """
+        if rack is None:
+            counts = self._rack_counts[:]
+        else:
+            counts = [0]*len(TILES)
+            for letter in rack:
+                counts[TILE_SLOTS[letter]] += 1
+
+        moves = []
+        singles = set()
+        across, down = self._cross_checks
+        clock = _SearchClock(deadline) if deadline is not None else None
+        for row, col in self._anchors:
+            if clock is not None and (clock.out_of_time
+                                      or time.perf_counter() > deadline):
+                break
+            self._moves_from_anchor(self._board, False, across, counts,
+                                    row, col, moves, singles, clock)
+            self._moves_from_anchor(self._board_t, True, down, counts,
+                                    col, row, moves, singles, clock)
+
+        moves.sort(key=lambda move: -move[1])
+        return moves
+
+    def _moves_from_anchor(self, board, is_vertical, cross, counts, row,
+                           anchor, moves, singles, clock):
+        """
+        Adds the moves through the anchor square at (row, anchor) of
+        `board` whose leftmost new tile is left of no other anchor,
+        until the _SearchClock `clock`, if any, runs out.
+        """
+        line = board[row*15:row*15 + 15]
+        if anchor > 0 and line[anchor - 1] != EMPTY:
+            # The left part is the tiles already on the board
+            start = anchor - 1
+            while start > 0 and line[start - 1] != EMPTY:
+                start -= 1
+            cursor = twl.cursor(line[start:anchor].decode().lower())
+            if cursor is not None:
+                self._extend_right(board, is_vertical, cross, counts, row,
+                                   anchor, start, anchor, cursor, [],
+                                   moves, singles, clock)
+            return
+
+        # Left parts from the rack can use the empty squares up to the
+        # previous anchor, which generates the moves that reach further
+        limit = 0
+        while anchor - limit > 0 and line[anchor - limit - 1] == EMPTY:
+            square = (anchor - limit - 1, row) if is_vertical else (row, anchor - limit - 1)
+            if square in self._anchors:
+                break
+            limit += 1
+        self._left_part(board, is_vertical, cross, counts, row, anchor,
+                        limit, twl.cursor(), [], moves, singles,
+                        clock)
+
+    def _left_part(self, board, is_vertical, cross, counts, row, anchor,
+                   limit, cursor, letters, moves, singles, clock):
+        """
+        Extends right from the anchor after each left part of up to
+        `limit` rack letters.
+        """
+        if clock is not None and clock.expired():
+            return
+
+        start = anchor - len(letters)
+        placed = [(row, start + i, letter) for i, letter in enumerate(letters)]
+        self._extend_right(board, is_vertical, cross, counts, row, anchor,
+                           start, anchor, cursor, placed, moves, singles, clock)
+        if len(letters) == limit:
+            return
+
+        for letter, tile in self._playable(cursor.child_mask(), counts):
+            cursor.push(letter)
+            counts[TILE_SLOTS[rack_letter(tile)]] -= 1
+            letters.append(tile)
+            self._left_part(board, is_vertical, cross, counts, row, anchor,
+                            limit, cursor, letters, moves, singles, clock)
+            letters.pop()
+            counts[TILE_SLOTS[rack_letter(tile)]] += 1
+            cursor.pop()
+
+    def _extend_right(self, board, is_vertical, cross, counts, row, anchor,
+                      start, col, cursor, placed, moves, singles, clock):
+        """
+        Extends the word from `col` rightwards, playing rack letters on
+        empty squares and following the tiles already on the board.
+        """
+        if clock is not None and clock.expired():
+            return
+
+        if col < 15 and board[row*15 + col] != EMPTY:
+            if cursor.push(chr(board[row*15 + col]).lower()):
+                self._extend_right(board, is_vertical, cross, counts, row,
+                                   anchor, start, col + 1, cursor, placed,
+                                   moves, singles, clock)
+                cursor.pop()
+            return
+
+        if col > anchor and cursor.is_word():
+            self._record_move(board, is_vertical, cross, row, start, col,
+                              placed, moves, singles)
+        if col == 15:
+            return
+
+        mask = cursor.child_mask()
+        if cross[row][col] is not None:
+            mask &= cross[row][col][0]
+        for letter, tile in self._playable(mask, counts):
+            cursor.push(letter)
+            counts[TILE_SLOTS[rack_letter(tile)]] -= 1
+            placed.append((row, col, tile))
+            self._extend_right(board, is_vertical, cross, counts, row,
+                               anchor, start, col + 1, cursor, placed,
+                               moves, singles, clock)
+            placed.pop()
+            counts[TILE_SLOTS[rack_letter(tile)]] += 1
+            cursor.pop()
+
+    def _playable(self, mask, counts):
+        """
+        Yields (letter, tile) for each letter in `mask` the rack can
+        play, as the tile itself and as a blank.
+        """
+        blanks = counts[BLANK_SLOT]
+        for letter in twl.mask_letters(mask & twl.ALL_LETTERS_MASK):
+            if counts[TILE_SLOTS[letter]]:
+                yield letter, letter
+            if blanks:
+                yield letter, letter.upper()
+
+    def _record_move(self, board, is_vertical, cross, row, start, end,
+                     placed, moves, singles):
+        """
+        Scores the word on `board` from `start` up to `end` and adds the
+        move, in real board coordinates, to `moves`.
+        """
+        new = dict(((r, c), letter) for r, c, letter in placed)
+        score = 0
+        multiplier = 1
+        cross_total = 0
+        for col in range(start, end):
+            if (row, col) not in new:
+                score += letter_score(chr(board[row*15 + col]))
+                continue
+
+            real = (col, row) if is_vertical else (row, col)
+            value = letter_score(new[(row, col)])*LETTER_MULTIPLIERS.get(real, 1)
+            score += value
+            multiplier *= WORD_MULTIPLIERS.get(real, 1)
+            if cross[row][col] is not None:
+                cross_sum = cross[row][col][1]
+                cross_total += (cross_sum + value)*WORD_MULTIPLIERS.get(real, 1)
+
+        score = score*multiplier + cross_total
+        if len(placed) == 7:
+            score += BINGO_BONUS
+
+        if is_vertical:
+            tiles = [(c, r, letter) for r, c, letter in placed]
+        else:
+            tiles = list(placed)
+
+        # A single tile can make words both ways, only list it once
+        if len(tiles) == 1:
+            if tiles[0] in singles:
+                return
+            singles.add(tiles[0])
+        moves.append((tiles, score))
+
 def test():
     scrabble = Scrabble()
 
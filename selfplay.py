@@ -0,0 +1,325 @@
+"""
+Headless self-play: complete games between strategies, without the
+pygame front end.
+
+A strategy is a callable given the Scrabble game on the turn of its
+player. It returns the tiles to play, a list of (row, col, letter) as for
+Scrabble.submit_turn, a string of rack tiles to exchange, or None to pass.
+
+Each game is seeded from the run seed and its index, so any game of a run
+can be replayed on its own with play_game(strategies, game_seed(seed, i)).
+play_games_parallel() shards the games of a run across a process pool and
+yields the same results, in the same order, as play_games().
+
+log_results() writes the moves of the games it is given to a move log as
+they stream by, and iter_log() reads a log back one game at a time. A log
+has a line per move: the game seed, the player, the rack before the move,
+the rack tiles the move used and its score, separated by tabs, with
+blanks written as '?'. Logs whose name ends in .gz are compressed.
+
+    python selfplay.py --games 1000 --bots greedy equity --processes 64
+"""
+import argparse
+import gzip
+import math
+import multiprocessing
+import time
+from array import array
+from collections import namedtuple
+
+from bots import BOTS
+from constants import *
+from leaves import load_table
+from scrabble import Scrabble, rack_letter
+import twl
+
+
+# A game ends after this many scoreless turns in a row
+MAX_SCORELESS_TURNS = 6
+
+# How blanks are written in move logs
+LOG_BLANK = '?'
+
+# Outcome of one game. `moves` has (player, rack, move, score, seconds)
+# for each turn, `rack` being the tiles held before the move, `move` what
+# the strategy returned and `seconds` how long it took to.
+GameResult = namedtuple('GameResult', 'seed scores moves seconds')
+
+
+def game_seed(seed, index):
+    """
+    Returns the seed of game `index` of a run seeded with `seed`.
+    """
+    return (seed << 32) | index
+
+def percentiles(values, points):
+    """
+    Returns the nearest-rank percentiles `points` (from 0 to 100) of
+    `values`, None for each if there are no values.
+    """
+    values = sorted(values)
+    if not values:
+        return [None]*len(points)
+    return [values[max(0, math.ceil(len(values)*point/100) - 1)]
+            for point in points]
+
+def rack_value(rack):
+    """
+    Returns the face value of the tiles on a rack.
+    """
+    return sum(LETTER_SCORE[letter] for letter in rack)
+
+def play_game(strategies, seed=None):
+    """
+    Plays a game between `strategies`, one per player in turn order, and
+    returns its GameResult. The game ends when a player uses their last
+    tile with the bag empty, or after MAX_SCORELESS_TURNS scoreless turns
+    in a row. The tiles left on each rack are then taken off its player's
+    score, and added to the score of the player who went out.
+    """
+    start = time.perf_counter()
+    game = Scrabble(False, len(strategies), seed)
+    moves = []
+    scoreless = 0
+    while True:
+        player = game.current_player()
+        rack = game.get_rack()
+        before = game.get_scores()[player]
+        move_start = time.perf_counter()
+        move = strategies[player](game)
+        seconds = time.perf_counter() - move_start
+        if isinstance(move, str):
+            valid = game.exchange_tiles(list(move))
+        elif move:
+            valid = game.submit_turn(move)
+        else:
+            valid = True
+        if not valid:
+            raise ValueError('Player %d made an invalid move: %r' % (player, move))
+
+        score = game.get_scores()[player] - before
+        moves.append((player, ''.join(rack), move, score, seconds))
+        if score == 0:
+            scoreless += 1
+        else:
+            scoreless = 0
+
+        went_out = not game.get_rack() and game.num_remaining_tiles() == 0
+        if went_out or scoreless >= MAX_SCORELESS_TURNS:
+            break
+        game.next_player()
+
+    scores = game.get_scores()
+    left = [rack_value(game.get_rack(p)) for p in range(len(strategies))]
+    for p in range(len(strategies)):
+        scores[p] -= left[p]
+    if went_out:
+        scores[player] += sum(left)
+
+    return GameResult(seed, scores, moves, time.perf_counter() - start)
+
+def play_games(strategies, games, seed=0):
+    """
+    Yields the GameResult of each of `games` games between `strategies`.
+    """
+    for i in range(games):
+        yield play_game(strategies, game_seed(seed, i))
+
+# Strategies and run seed of a pool worker, set by _init_worker
+_WORKER_STRATEGIES = None
+_WORKER_SEED = None
+
+def _init_worker(strategies, seed, cache):
+    global _WORKER_STRATEGIES, _WORKER_SEED
+    _WORKER_STRATEGIES = strategies
+    _WORKER_SEED = seed
+    # Forked workers inherit the parent's dictionary, others map the cache
+    if cache is not None and not twl.is_loaded():
+        twl.use_cache(cache)
+    twl.load()
+
+def _play_worker_game(index):
+    return play_game(_WORKER_STRATEGIES, game_seed(_WORKER_SEED, index))
+
+def play_games_parallel(strategies, games, seed=0, processes=None,
+                        cache=None, chunk_size=4):
+    """
+    Yields the GameResult of each of `games` games between `strategies`,
+    played by a pool of `processes` worker processes (one per core by
+    default). The results stream back in game order as the games finish,
+    and are the same as those of play_games() with the same seed.
+
+    The strategies must be picklable, module level functions for
+    instance. The dictionary is loaded once before the pool starts, from
+    the cache file at `cache` if given, and every worker reuses it:
+    forked workers share the parent's pages, spawned ones memory-map the
+    cache. Games are handed out `chunk_size` at a time.
+    """
+    if cache is not None and not twl.is_loaded():
+        twl.use_cache(cache)
+    twl.load()
+    pool = multiprocessing.Pool(processes, _init_worker, (strategies, seed, cache))
+    try:
+        for result in pool.imap(_play_worker_game, range(games), chunk_size):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+def used_tiles(move):
+    """
+    Returns the rack tiles a strategy's move takes off the rack.
+    """
+    if isinstance(move, str):
+        return move
+    if move:
+        return ''.join(rack_letter(letter) for _, _, letter in move)
+    return ''
+
+def open_log(path, mode='r'):
+    """
+    Opens a move log as a text file, compressed if `path` ends in .gz.
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't')
+    return open(path, mode)
+
+def log_results(results, f):
+    """
+    Writes the moves of each game result to the move log open as `f`, and
+    yields the result.
+    """
+    for result in results:
+        for player, rack, move, score, _ in result.moves:
+            f.write('%d\t%d\t%s\t%s\t%d\n' % (
+                result.seed, player, rack.replace(BLANK, LOG_BLANK),
+                used_tiles(move).replace(BLANK, LOG_BLANK), score))
+        yield result
+
+def iter_log(path):
+    """
+    Yields the games of a move log, each as a list of (player, rack,
+    used, score) with blanks as BLANK, reading one game at a time.
+    """
+    game = []
+    seed = None
+    with open_log(path) as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            if fields[0] != seed and game:
+                yield game
+                game = []
+            seed = fields[0]
+            game.append((int(fields[1]), fields[2].replace(LOG_BLANK, BLANK),
+                         fields[3].replace(LOG_BLANK, BLANK), int(fields[4])))
+    if game:
+        yield game
+
+
+class Summary():
+    """
+    Running totals over game results: wins, scores, speed and the time
+    each player took per move.
+
+    The speed is in games per second of wall time since the Summary was
+    made, so that games played in parallel count as such. Make it before
+    the games start, or pass their start time as a time.perf_counter()
+    value in `start`.
+    """
+    def __init__(self, players, start=None):
+        self.games = 0
+        self.turns = 0
+        self.wins = [0]*players
+        self.ties = 0
+        self.totals = [0]*players
+        self.game_seconds = 0.0
+        self.latencies = [array('d') for _ in range(players)]
+        self.start = time.perf_counter() if start is None else start
+
+    def add(self, result):
+        """
+        Adds a game result to the totals.
+        """
+        self.games += 1
+        self.turns += len(result.moves)
+        self.game_seconds += result.seconds
+        best = max(result.scores)
+        winners = [p for p, score in enumerate(result.scores) if score == best]
+        if len(winners) > 1:
+            self.ties += 1
+        else:
+            self.wins[winners[0]] += 1
+        for p, score in enumerate(result.scores):
+            self.totals[p] += score
+        for player, _, _, _, seconds in result.moves:
+            self.latencies[player].append(seconds)
+
+    def games_per_second(self):
+        """
+        Returns the games added per second of wall time since `start`.
+        """
+        elapsed = time.perf_counter() - self.start
+        return self.games / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        """
+        Returns a printable summary of the totals.
+        """
+        games = max(self.games, 1)
+        lines = ['%d games, %.1f turns and %.0f ms per game, %.2f games/s' % (
+            self.games, self.turns / games, 1000*self.game_seconds / games,
+            self.games_per_second())]
+        for p in range(len(self.wins)):
+            lines.append('player %d: %d wins, mean score %.1f' % (
+                p, self.wins[p], self.totals[p] / games))
+            if self.latencies[p]:
+                lines.append('    move latency ms: p50 %.1f, p90 %.1f, p99 %.1f, max %.1f' % tuple(
+                    1000*seconds for seconds in
+                    percentiles(self.latencies[p], (50, 90, 99, 100))))
+        lines.append('%d ties' % self.ties)
+        return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Plays Scrabble games between bots.')
+    parser.add_argument('--games', type=int, default=10)
+    parser.add_argument('--bots', nargs='+', choices=sorted(BOTS),
+                        default=['greedy', 'greedy'], help='bot of each player')
+    parser.add_argument('--budget', type=float,
+                        help='time budget per move in milliseconds')
+    parser.add_argument('--leaves', help='leave table for the equity bots')
+    parser.add_argument('--log', help='move log to write, compressed if .gz')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=1,
+                        help='worker processes, 0 for one per core')
+    parser.add_argument('--cache', help='dictionary cache file for the workers')
+    args = parser.parse_args()
+
+    budget = args.budget / 1000 if args.budget is not None else None
+    strategies = []
+    for name in args.bots:
+        if name == 'equity' and args.leaves:
+            strategies.append(BOTS[name](load_table(args.leaves), budget))
+        else:
+            strategies.append(BOTS[name](budget=budget))
+    if args.processes == 1:
+        # Load the word list up front so it is not timed as part of a game
+        twl.load()
+        results = play_games(strategies, args.games, args.seed)
+    else:
+        results = play_games_parallel(strategies, args.games, args.seed,
+                                      args.processes or None, args.cache)
+    # The results are generated lazily, so the games start after this
+    summary = Summary(len(strategies))
+    if args.log:
+        with open_log(args.log, 'w') as f:
+            for result in log_results(results, f):
+                summary.add(result)
+    else:
+        for result in results:
+            summary.add(result)
+    print(summary.report())
+
+
+if __name__ == '__main__':
+    main()
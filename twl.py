@@ -8,6 +8,7 @@ Functionality:
 - Enumerate all words in the dictionary.
 - Determine what letters may appear after a given prefix.
 - Determine what words can be formed by anagramming a set of letters.
+- Find words matching a pattern, per-position letter sets and a rack.
 
 Sample usage:
 
@@ -35,7 +36,14 @@ benefit of this method over others - it is optimized for low memory
 usage (not speed).
 
 The data is stored in the Python module as a base-64 encoded,
-zlib-compressed string.
+zlib-compressed string. It is only decoded the first time the
+dictionary is used, so importing this module is cheap. Call load() to
+decode it eagerly; load_time() reports how long decoding took.
+
+Processes that run side by side can instead call use_cache(path) to
+memory-map a binary cache of the decoded records and transition table,
+so they share one physical copy. The cache is checked against a digest
+of the embedded data and a CRC, and rebuilt when either does not match.
 
 Each record of the DAWG table is packed into a 32-bit integer.
 
@@ -45,6 +53,8 @@ M - More Flag
 L - ASCII Letter (lowercase or '$')
 I - Index (Pointer)
 
+The table is decoded once at load time into an array of unsigned 32-bit
+integers, so traversals read records directly without unpacking bytes.
 The helper method _get_record(index) will extract these three elements
 into a Python tuple such as (True, 'a', 26).
 
@@ -109,6 +119,16 @@ found. If this value is found, the string is a word in the dictionary.
 If at any point during the search the appropriate child is not found,
 the search fails - the string is not a word.
 
+By default a dense transition table is also built at load time. It maps
+each (node, letter) pair to the child node in a single array lookup, so
+check, children and anagram no longer scan sibling records. It costs
+about 6 MB; call use_transitions(False) to drop it and fall back to the
+compact scan.
+
+Every node also has a precomputed 27-bit child mask, one bit per letter
+plus one for END. child_mask(), letters_mask() and playable_mask() expose
+them so that "which rack letters may follow this prefix" is a single AND.
+
 See also:
 
 http://code.activestate.com/recipes/577835-self-contained-twl06-dictionary-module-500-kb/
@@ -116,10 +136,15 @@ http://en.wikipedia.org/wiki/Official_Tournament_and_Club_Word_List
 http://www.isc.ro/lists/twl06.zip
 '''
 
+import array
 import base64
-import collections
+import hashlib
 import itertools
+import mmap
+import os
 import struct
+import sys
+import time
 import zlib
 
 def check(word):
@@ -132,9 +157,21 @@ def check(word):
     >>> twl.check('asdf')
     False
     '''
-    return word in _DAWG
+    return word in _dawg()
+
+def check_many(words):
+    '''
+    Returns a list with True or False for each of `words`, in order,
+    depending on whether it exists in the dictionary. Without the
+    transition table the words are walked in sorted order, so shared
+    prefixes are only scanned once.
 
-def iterator():
+    >>> twl.check_many(['dog', 'dgo', 'dogs'])
+    [True, False, True]
+    '''
+    return _dawg().check_many(words)
+
+def iterator(chunk_size=None):
     '''
     Returns an iterator that will yield all words stored in the
     dictionary in alphabetical order.
@@ -144,16 +181,80 @@ def iterator():
     all, this Python module is significantly smaller than the
     original word list file - 500KB vs 1900KB.)
 
+    If `chunk_size` is given, yields lists of up to that many words
+    instead, which is faster when loading the words in bulk.
+
     >>> words = set(twl.iterator())
     >>> words = list(twl.iterator())
+    >>> words = [w for chunk in twl.iterator(1024) for w in chunk]
     '''
-    return iter(_DAWG)
+    if chunk_size is not None:
+        return _dawg().iter_chunks(chunk_size)
+    return iter(_dawg())
 
 def children(prefix):
     '''
     Returns a list of letters that may appear after `prefix`.
     '''
-    return _DAWG.children(prefix)
+    return _dawg().children(prefix)
+
+def child_mask(prefix):
+    '''
+    Returns the mask of letters that may appear after `prefix`, with
+    bits 0-25 for 'a'-'z' and bit 26 for END. 0 if no word starts with
+    `prefix`. The mask form of `children`.
+
+    >>> twl.mask_letters(twl.child_mask('dude'))
+    ['$', 'd', 'e', 's']
+    '''
+    return _dawg().child_mask(prefix)
+
+def playable_mask(prefix, letters):
+    '''
+    Returns the letters of `letters` (a rack, possibly with '?') that
+    may appear after `prefix`, as a mask. A single AND of the node mask
+    and the rack mask.
+
+    >>> twl.mask_letters(twl.playable_mask('dud', 'abde'))
+    ['d', 'e']
+    '''
+    return _dawg().child_mask(prefix) & letters_mask(letters)
+
+def cursor(prefix=''):
+    '''
+    Returns a Cursor positioned after `prefix`, for extending a prefix
+    one letter at a time without re-walking it from the root. Returns
+    None if no word starts with `prefix`.
+
+    >>> c = twl.cursor('do')
+    >>> c.push('g')
+    True
+    >>> c.is_word()
+    True
+    '''
+    c = _dawg().cursor()
+    for letter in prefix:
+        if not c.push(letter):
+            return None
+    return c
+
+def use_transitions(enabled=True):
+    '''
+    Builds (or frees) the dense transition table used by `check`,
+    `children` and `anagram`. It is built by default; disable it in
+    memory-constrained deployments to fall back to scanning the
+    compact DAWG records.
+    '''
+    global _TRANSITIONS
+    _TRANSITIONS = enabled
+    if _DAWG is None:
+        # Applied when the dictionary is loaded
+        return
+    if enabled:
+        if _DAWG.transitions is None:
+            _DAWG.build_transitions()
+    else:
+        _DAWG.drop_transitions()
 
 def anagram(letters):
     '''
@@ -161,87 +262,621 @@ def anagram(letters):
     given `letters`. `letters` may include '?' characters as
     a wildcard.
     '''
-    for word in _DAWG.anagram(letters):
-        yield word
+    return _dawg().anagram(letters)
+
+def search(pattern=None, rack=None, min_length=None, max_length=None,
+        allowed=None):
+    '''
+    Yields, in alphabetical order, the words matching all the given
+    constraints. The DAWG is walked once, pruning as it goes, rather
+    than filtering every word.
+
+    `pattern` fixes letters by position, with '?' matching any letter.
+    Positions past the end of the pattern are unconstrained.
+    `allowed` is a sequence giving, per position, a string of the
+    letters permitted there (or None for any).
+    `rack`, if given, must supply the letters of every position not
+    fixed by `pattern` (the fixed ones are already on the board). It
+    may include '?' blanks.
+    `min_length` and `max_length` default to the length of `pattern`,
+    or to 2 and 15 without one.
+
+    >>> list(twl.search('?a??e?s', rack='bkrst?'))[:3]
+    ['backers', 'baiters', 'balkers']
+    '''
+    if pattern is not None:
+        if min_length is None:
+            min_length = len(pattern)
+        if max_length is None:
+            max_length = len(pattern)
+    if min_length is None:
+        min_length = 2
+    if max_length is None:
+        max_length = 15
+    positions = []
+    fixed = []
+    for i in range(max_length):
+        letter = WILD
+        if pattern is not None and i < len(pattern):
+            letter = pattern[i]
+        mask = ALL_LETTERS_MASK if letter == WILD else letter_bit(letter)
+        if allowed is not None and i < len(allowed) and allowed[i] is not None:
+            mask &= letters_mask(allowed[i])
+        positions.append(mask)
+        fixed.append(letter != WILD)
+    return _dawg().search(positions, fixed, rack, min_length)
+
+def load():
+    '''
+    Loads the dictionary now instead of on first use and returns the
+    number of seconds the load took. Does nothing if it is already
+    loaded.
+    '''
+    _dawg()
+    return _LOAD_TIME
+
+def is_loaded():
+    '''
+    Returns True if the dictionary has been loaded.
+    '''
+    return _DAWG is not None
+
+def load_time():
+    '''
+    Returns the number of seconds it took to decode the dictionary,
+    or None if it has not been loaded yet.
+    '''
+    return _LOAD_TIME
+
+def _dawg():
+    if _DAWG is None:
+        _load()
+    return _DAWG
+
+def _load():
+    global _DAWG, _LOAD_TIME
+    start = time.perf_counter()
+    if _CACHE_PATH is not None:
+        dawg = _load_cache(_CACHE_PATH)
+    else:
+        dawg = _Dawg(_decode_data(_DATA), _TRANSITIONS)
+    _LOAD_TIME = time.perf_counter() - start
+    _DAWG = dawg
+
+def use_cache(path):
+    '''
+    Loads the dictionary from a binary cache file at `path` instead of
+    decoding the embedded data. The file is memory-mapped read-only, so
+    every process on a host using the same file shares its pages. It is
+    (re)built automatically if missing, corrupt or out of date. Pass
+    None to go back to decoding the embedded data.
+
+    Must be called before the dictionary is first used.
+    '''
+    global _CACHE_PATH
+    _CACHE_PATH = path
+
+def write_cache(path):
+    '''
+    Writes the decoded records, child masks and transition table to a
+    binary cache file at `path`. The file is written to a temporary
+    name first and renamed into place, so concurrent readers never see
+    a partial file.
+    '''
+    if _DAWG is not None and _DAWG.transitions is not None:
+        dawg = _DAWG
+    else:
+        dawg = _Dawg(_decode_data(_DATA))
+    write_sections(path, CACHE_MAGIC, CACHE_VERSION, data_digest(), [
+        (getattr(dawg, name), typecode) for name, typecode in CACHE_SECTIONS])
+
+def _load_cache(path):
+    try:
+        return _open_cache(path)
+    except (OSError, ValueError):
+        write_cache(path)
+        return _open_cache(path)
+
+def _open_cache(path):
+    '''
+    Memory-maps a cache file written by write_cache. Raises ValueError
+    if it does not match the embedded data or fails its checksum.
+    '''
+    values, mapped = read_sections(
+        path, CACHE_MAGIC, CACHE_VERSION, data_digest(),
+        [typecode for _, typecode in CACHE_SECTIONS])
+    sections = dict(zip([name for name, _ in CACHE_SECTIONS], values))
+    dawg = _Dawg(sections['records'], False, sections['record_masks'])
+    if _TRANSITIONS:
+        dawg.node_starts = sections['node_starts']
+        dawg.transitions = sections['transitions']
+        dawg.node_masks = sections['node_masks']
+    # Keep the mapping alive as long as the views into it
+    dawg.mapped = mapped
+    return dawg
+
+def sections_header(count):
+    '''
+    Returns the struct of the header of a write_sections file with
+    `count` sections: magic, version, digest, CRC and section lengths.
+    '''
+    return struct.Struct('<4sI20sI' + 'I' * count)
+
+def write_sections(path, magic, version, digest, sections):
+    '''
+    Writes `sections`, a list of (values, typecode) pairs, to a binary
+    file at `path` as little-endian arrays. They follow a header with a
+    4-byte `magic`, a `version`, a 20-byte `digest` of what the data was
+    built from, a CRC of the sections and the length of each. The file
+    is written to a temporary name first and renamed into place, so
+    concurrent readers never see a partial file.
+    '''
+    payload = []
+    counts = []
+    for values, typecode in sections:
+        payload.append(_encode_section(values, typecode))
+        counts.append(len(values))
+    crc = 0
+    for section in payload:
+        crc = zlib.crc32(section, crc)
+    header = sections_header(len(sections)).pack(
+        magic, version, digest, crc, *counts)
+    temp = '%s.%d.tmp' % (path, os.getpid())
+    with open(temp, 'wb') as f:
+        f.write(header)
+        for section in payload:
+            f.write(section)
+    os.replace(temp, path)
+
+def read_sections(path, magic, version, digest, typecodes):
+    '''
+    Memory-maps a file written by write_sections and returns its
+    sections, as arrays of `typecodes` viewing the file, and the
+    mapping, which must be kept alive as long as they are. Raises
+    ValueError if the file has another magic, version or digest, or
+    fails its checksum.
+    '''
+    header = sections_header(len(typecodes))
+    name = magic.decode('ascii')
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    if len(view) < header.size:
+        raise ValueError('Truncated %s file' % name)
+    found, found_version, found_digest, crc, *counts = header.unpack_from(view)
+    if found != magic or found_version != version:
+        raise ValueError('Not a version %d %s file' % (version, name))
+    if found_digest != digest:
+        raise ValueError('Stale %s file' % name)
+    sizes = [array.array(typecode).itemsize * count
+             for typecode, count in zip(typecodes, counts)]
+    if len(view) != header.size + sum(sizes):
+        raise ValueError('Truncated %s file' % name)
+    if zlib.crc32(view[header.size:]) != crc:
+        raise ValueError('Corrupt %s file' % name)
+    sections = []
+    offset = header.size
+    for typecode, size in zip(typecodes, sizes):
+        sections.append(_decode_section(view[offset:offset + size], typecode))
+        offset += size
+    return sections, mapped
+
+def _encode_section(values, typecode):
+    values = array.array(typecode, values)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tobytes()
+
+def _decode_section(view, typecode):
+    if sys.byteorder == 'big':
+        # Cannot share little-endian pages, fall back to a swapped copy
+        values = array.array(typecode, view.tobytes())
+        values.byteswap()
+        return values
+    return view.cast(typecode)
+
+def data_digest():
+    '''
+    Returns the SHA-1 digest of the embedded data, which identifies the
+    word list files built from it.
+    '''
+    return hashlib.sha1(_DATA.encode('ascii')).digest()
 
 END = '$'
 WILD = '?'
 
-class _Dawg(object):
-    def __init__(self, data):
-        data = base64.b64decode(data)
-        data = zlib.decompress(data)
-        self.data = data
+MORE_MASK = 0x80000000
+LINK_MASK = 0xffffff
+
+# Typecode of a 4-byte unsigned integer for the record array
+RECORD_TYPECODE = 'I' if array.array('I').itemsize == 4 else 'L'
+
+# Slots of the dense transition table: 'a'-'z' followed by END
+ALPHABET = 'abcdefghijklmnopqrstuvwxyz'
+SLOTS = len(ALPHABET) + 1
+END_SLOT = len(ALPHABET)
+LETTER_SLOTS = dict((letter, i) for i, letter in enumerate(ALPHABET))
+NO_CHILD = -1
+
+# Number of words buffered at a time by _Dawg.__iter__
+ITER_CHUNK = 4096
+
+# Marks a letter played with a wildcard in _Dawg.anagram
+WILD_SLOT = -1
+
+# Child masks have one bit per slot
+END_BIT = 1 << END_SLOT
+ALL_LETTERS_MASK = END_BIT - 1
+
+# Binary cache file layout, see write_sections: the _Dawg arrays below as
+# little-endian 32-bit integers
+CACHE_MAGIC = b'TWLD'
+CACHE_VERSION = 2
+CACHE_SECTIONS = (
+    ('records', RECORD_TYPECODE),
+    ('record_masks', 'i'),
+    ('node_starts', 'i'),
+    ('transitions', 'i'),
+    ('node_masks', 'i'),
+)
+
+def _decode_data(data):
+    '''
+    Decodes the embedded base-64, zlib-compressed table into records.
+    '''
+    data = base64.b64decode(data)
+    data = zlib.decompress(data)
+    return _decode_records(data)
+
+def _decode_records(data):
+    '''
+    Decodes the packed little-endian DAWG table into an array of
+    32-bit records, one per edge.
+    '''
+    records = array.array(RECORD_TYPECODE)
+    records.frombytes(data)
+    if sys.byteorder == 'big':
+        records.byteswap()
+    return records
+
+def letter_bit(letter):
+    '''
+    Returns the bit for `letter` in a child mask. Bits 0-25 are 'a'-'z'
+    and bit 26 is END.
+    '''
+    if letter == END:
+        return END_BIT
+    return 1 << LETTER_SLOTS[letter]
+
+def _counts_mask(counts):
+    '''
+    Returns the mask of the letters with a non-zero count in `counts`,
+    a list of 26 per-letter counts.
+    '''
+    mask = 0
+    for slot, count in enumerate(counts):
+        if count:
+            mask |= 1 << slot
+    return mask
+
+def letters_mask(letters):
+    '''
+    Returns the mask of the distinct letters in `letters`. A '?'
+    wildcard sets every letter bit.
+
+    >>> twl.mask_letters(twl.letters_mask('top'))
+    ['o', 'p', 't']
+    '''
+    mask = 0
+    for letter in letters:
+        if letter == WILD:
+            mask |= ALL_LETTERS_MASK
+        else:
+            mask |= letter_bit(letter)
+    return mask
+
+def mask_letters(mask):
+    '''
+    Returns the letters set in `mask`, END first, then alphabetically,
+    matching the order of `children`.
+    '''
+    result = [END] if mask & END_BIT else []
+    for slot, letter in enumerate(ALPHABET):
+        if mask & (1 << slot):
+            result.append(letter)
+    return result
+
+class Cursor(object):
+    '''
+    A position in the DAWG that keeps the stack of nodes leading to it,
+    so extending or shortening the current prefix costs a single edge
+    traversal. Created by twl.cursor().
+    '''
+    def __init__(self, dawg):
+        self._dawg = dawg
+        self._table = dawg.transitions
+        self._masks = dawg._masks()
+        self._nodes = [0]
+        self._letters = []
+
+    @property
+    def prefix(self):
+        '''
+        The letters pushed so far.
+        '''
+        return ''.join(self._letters)
+
+    def __len__(self):
+        return len(self._letters)
+
+    def push(self, letter):
+        '''
+        Extends the prefix by `letter`. Returns False, leaving the cursor
+        unchanged, if no word continues with that letter.
+        '''
+        node = self._nodes[-1]
+        if self._table is not None:
+            slot = LETTER_SLOTS.get(letter)
+            if slot is None:
+                return False
+            child = self._table[node * SLOTS + slot]
+            if child == NO_CHILD:
+                return False
+        else:
+            child = self._dawg._get_child(node, letter)
+            if child in (0, None):
+                return False
+        self._nodes.append(child)
+        self._letters.append(letter)
+        return True
+
+    def pop(self):
+        '''
+        Removes and returns the last letter of the prefix.
+        '''
+        if not self._letters:
+            raise IndexError('pop from an empty cursor')
+        self._nodes.pop()
+        return self._letters.pop()
+
+    def is_word(self):
+        '''
+        True if the current prefix is a word in the dictionary.
+        '''
+        return bool(self._masks[self._nodes[-1]] & END_BIT)
+
+    def child_mask(self):
+        '''
+        Returns the mask of letters that may follow the current prefix,
+        see letter_bit().
+        '''
+        return self._masks[self._nodes[-1]]
+
+class RecordGraph(object):
+    '''
+    A word graph stored as runs of compact records, see the module
+    docstring. Subclasses with other letters in their records override
+    letter_bit.
+    '''
+    letter_bit = staticmethod(letter_bit)
+    def __init__(self, records, record_masks=None):
+        self.records = records
+        if record_masks is None:
+            record_masks = self._build_record_masks()
+        self.record_masks = record_masks
+    def _build_record_masks(self):
+        '''
+        Computes, for every record, the child mask of it and the
+        siblings after it. At the first record of a node this is the
+        mask of all letters that may follow the node.
+        '''
+        records = self.records
+        bit = self.letter_bit
+        masks = array.array('i', bytes(4 * len(records)))
+        mask = 0
+        for index in range(len(records) - 1, -1, -1):
+            x = records[index]
+            if not x & MORE_MASK:
+                mask = 0
+            mask |= bit(chr((x >> 24) & 0x7f))
+            masks[index] = mask
+        return masks
     def _get_record(self, index):
-        a = index * 4
-        b = index * 4 + 4
-        x = struct.unpack('<I', self.data[a:b])[0]
-        more = bool(x & 0x80000000)
+        x = self.records[index]
+        more = bool(x & MORE_MASK)
         letter = chr((x >> 24) & 0x7f)
-        link = int(x & 0xffffff)
+        link = x & LINK_MASK
         return (more, letter, link)
     def _get_child(self, index, letter):
+        records = self.records
+        code = ord(letter)
         while True:
-            more, other, link = self._get_record(index)
-            if other == letter:
-                return link
-            if not more:
+            x = records[index]
+            if (x >> 24) & 0x7f == code:
+                return x & LINK_MASK
+            if not x & MORE_MASK:
                 return None
             index += 1
     def _get_children(self, index):
+        records = self.records
         result = []
         while True:
-            more, letter, link = self._get_record(index)
-            result.append(letter)
-            if not more:
+            x = records[index]
+            result.append(chr((x >> 24) & 0x7f))
+            if not x & MORE_MASK:
                 break
             index += 1
         return result
-    def _anagram(self, bag, index=0, letters=None):
-        letters = letters or []
-        while True:
-            more, letter, link = self._get_record(index)
-            if letter == END:
-                yield ''.join(letters)
-            elif bag[letter]:
-                bag[letter] -= 1
-                letters.append(letter)
-                for word in self._anagram(bag, link, letters):
-                    yield word
-                letters.pop(-1)
-                bag[letter] += 1
-            elif bag[WILD]:
-                bag[WILD] -= 1
-                letters.append(letter)
-                for word in self._anagram(bag, link, letters):
-                    yield word
-                letters.pop(-1)
-                bag[WILD] += 1
-            if not more:
-                break
-            index += 1
+
+class _Dawg(RecordGraph):
+    def __init__(self, records, transitions=True, record_masks=None):
+        RecordGraph.__init__(self, records, record_masks)
+        self.transitions = None
+        self.node_starts = None
+        self.node_masks = None
+        if transitions:
+            self.build_transitions()
+    def build_transitions(self):
+        '''
+        Builds the dense (node, letter) -> child table. Each node
+        (the first record of a run of siblings) gets a row of SLOTS
+        child node ids, NO_CHILD where there is no edge. About 6 MB
+        for TWL06.
+        '''
+        records = self.records
+        node_ids = {0: 0}
+        node_starts = array.array('i', [0])
+        for x in records:
+            if (x >> 24) & 0x7f != ord(END):
+                link = x & LINK_MASK
+                if link not in node_ids:
+                    node_ids[link] = len(node_starts)
+                    node_starts.append(link)
+        table = array.array('i', [NO_CHILD]) * (len(node_starts) * SLOTS)
+        for node, index in enumerate(node_starts):
+            row = node * SLOTS
+            while True:
+                x = records[index]
+                letter = chr((x >> 24) & 0x7f)
+                if letter == END:
+                    table[row + END_SLOT] = 0
+                else:
+                    table[row + LETTER_SLOTS[letter]] = node_ids[x & LINK_MASK]
+                if not x & MORE_MASK:
+                    break
+                index += 1
+        self.node_starts = node_starts
+        self.transitions = table
+        self.node_masks = array.array(
+            'i', (self.record_masks[index] for index in node_starts))
+    def drop_transitions(self):
+        '''
+        Frees the transition table, falling back to scanning the
+        compact records.
+        '''
+        self.transitions = None
+        self.node_starts = None
+        self.node_masks = None
+    def _masks(self):
+        '''
+        Returns the child masks indexed the same way as nodes: by node
+        id with the transition table, by record index without.
+        '''
+        if self.transitions is not None:
+            return self.node_masks
+        return self.record_masks
+    def child_mask(self, prefix):
+        if self.transitions is not None:
+            node = self._walk(prefix)
+            if node is None:
+                return 0
+            return self.node_masks[node]
+        index = 0
+        for letter in prefix:
+            index = self._get_child(index, letter)
+            if index in (0, None):
+                return 0
+        return self.record_masks[index]
+    def _walk(self, prefix):
+        table = self.transitions
+        node = 0
+        for letter in prefix:
+            slot = LETTER_SLOTS.get(letter)
+            if slot is None:
+                return None
+            node = table[node * SLOTS + slot]
+            if node == NO_CHILD:
+                return None
+        return node
     def __contains__(self, word):
+        if self.transitions is not None:
+            node = self._walk(word)
+            return (node is not None and
+                self.transitions[node * SLOTS + END_SLOT] != NO_CHILD)
         index = 0
         for letter in itertools.chain(word, END):
             index = self._get_child(index, letter)
             if index is None:
                 return False
         return True
-    def __iter__(self, index=0, letters=None):
-        letters = letters or []
-        while True:
-            more, letter, link = self._get_record(index)
-            if letter == END:
-                yield ''.join(letters)
+    def check_many(self, words):
+        table = self.transitions
+        if table is not None:
+            # Each word is a few table lookups, sharing prefixes saves less
+            # than sorting costs
+            walk = self._walk
+            results = []
+            for word in words:
+                node = walk(word)
+                results.append(
+                    node is not None and table[node * SLOTS + END_SLOT] != NO_CHILD)
+            return results
+        words = list(words)
+        results = [False] * len(words)
+        order = sorted(range(len(words)), key=words.__getitem__)
+        # path[i] is the node reached by the first i letters of previous
+        path = [0]
+        previous = ''
+        for position in order:
+            word = words[position]
+            # Reuse the nodes of the prefix shared with the previous word
+            depth = 0
+            limit = min(len(word), len(previous), len(path) - 1)
+            while depth < limit and word[depth] == previous[depth]:
+                depth += 1
+            del path[depth + 1:]
+            node = path[depth]
+            for letter in word[depth:]:
+                node = self._get_child(node, letter)
+                if node in (0, None):
+                    break
+                path.append(node)
             else:
-                letters.append(letter)
-                for word in self.__iter__(link, letters):
-                    yield word
-                letters.pop(-1)
-            if not more:
-                break
+                results[position] = self._get_child(node, END) is not None
+            previous = word
+        return results
+    def __iter__(self):
+        return itertools.chain.from_iterable(self.iter_chunks(ITER_CHUNK))
+    def iter_chunks(self, size):
+        '''
+        Yields lists of up to `size` words in alphabetical order. Walks
+        the DAWG with an explicit stack of the sibling record to resume
+        at for each letter of the current prefix.
+        '''
+        records = self.records
+        end = ord(END)
+        prefix = ''
+        stack = []
+        chunk = []
+        index = 0
+        while True:
+            x = records[index]
+            code = (x >> 24) & 0x7f
+            if code != end:
+                stack.append((index, prefix))
+                prefix += chr(code)
+                index = x & LINK_MASK
+                continue
+            chunk.append(prefix)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+            # Move to the next sibling, backing up past exhausted nodes
+            while not records[index] & MORE_MASK:
+                if not stack:
+                    if chunk:
+                        yield chunk
+                    return
+                index, prefix = stack.pop()
             index += 1
+    def cursor(self):
+        return Cursor(self)
     def children(self, prefix):
+        if self.transitions is not None:
+            node = self._walk(prefix)
+            if node is None:
+                return []
+            return self._get_children(self.node_starts[node])
         index = 0
         for letter in prefix:
             index = self._get_child(index, letter)
@@ -249,13 +884,203 @@ class _Dawg(object):
                 return []
         return self._get_children(index)
     def anagram(self, letters):
-        bag = collections.defaultdict(int)
+        '''
+        Yields the words that can be made from `letters`. Both engines
+        walk the DAWG with an explicit stack, tracking the rack as 26
+        letter counts plus a wildcard count, and only enter a child if
+        its mask shares a letter (or END) with what is left of the rack.
+        '''
+        counts = [0] * len(ALPHABET)
+        wilds = 0
         for letter in letters:
-            bag[letter] += 1
-        for word in self._anagram(bag):
-            yield word
+            if letter == WILD:
+                wilds += 1
+            elif letter in LETTER_SLOTS:
+                counts[LETTER_SLOTS[letter]] += 1
+        if self.transitions is not None:
+            return self._anagram_transitions(counts, wilds)
+        return self._anagram_records(counts, wilds)
+    def _anagram_transitions(self, counts, wilds):
+        # Visits only the letters in (node mask & rack mask), lowest
+        # bit first, so siblings the rack cannot play are never touched
+        table = self.transitions
+        masks = self.node_masks
+        available = _counts_mask(counts)
+        stack = []
+        prefix = ''
+        node = 0
+        mask = masks[0]
+        pending = mask & (ALL_LETTERS_MASK if wilds else available)
+        while True:
+            if mask & END_BIT:
+                yield prefix
+            while not pending:
+                if not stack:
+                    return
+                node, pending, prefix, used, available = stack.pop()
+                if used == WILD_SLOT:
+                    wilds += 1
+                else:
+                    counts[used] += 1
+            bit = pending & -pending
+            pending ^= bit
+            slot = bit.bit_length() - 1
+            if counts[slot]:
+                used = slot
+                left = available
+                if counts[slot] == 1:
+                    left &= ~bit
+                remaining = wilds
+            else:
+                used = WILD_SLOT
+                left = available
+                remaining = wilds - 1
+            usable = ALL_LETTERS_MASK if remaining else left
+            child = table[node * SLOTS + slot]
+            mask = masks[child]
+            if not mask & (usable | END_BIT):
+                mask = 0
+                continue
+            stack.append((node, pending, prefix, used, available))
+            if used == WILD_SLOT:
+                wilds -= 1
+            else:
+                counts[used] -= 1
+            prefix += ALPHABET[slot]
+            available = left
+            node = child
+            pending = mask & usable
+    def _anagram_records(self, counts, wilds):
+        records = self.records
+        masks = self.record_masks
+        end = ord(END)
+        base = ord('a')
+        available = _counts_mask(counts)
+        stack = []
+        prefix = ''
+        index = 0
+        while True:
+            x = records[index]
+            code = (x >> 24) & 0x7f
+            if code == end:
+                yield prefix
+            else:
+                slot = code - base
+                if counts[slot]:
+                    used = slot
+                    left = available
+                    if counts[slot] == 1:
+                        left &= ~(1 << slot)
+                    usable = ALL_LETTERS_MASK if wilds else left
+                elif wilds:
+                    used = WILD_SLOT
+                    left = available
+                    usable = ALL_LETTERS_MASK if wilds > 1 else left
+                else:
+                    used = None
+                if used is not None:
+                    link = x & LINK_MASK
+                    if masks[link] & (usable | END_BIT):
+                        stack.append((index, prefix, used, available))
+                        if used == WILD_SLOT:
+                            wilds -= 1
+                        else:
+                            counts[used] -= 1
+                        prefix += chr(code)
+                        available = left
+                        index = link
+                        continue
+            # Move to the next sibling, backing up past nodes with no
+            # remaining sibling the rack can use
+            while True:
+                if records[index] & MORE_MASK:
+                    usable = ALL_LETTERS_MASK if wilds else available
+                    if masks[index + 1] & (usable | END_BIT):
+                        break
+                if not stack:
+                    return
+                index, prefix, used, available = stack.pop()
+                if used == WILD_SLOT:
+                    wilds += 1
+                else:
+                    counts[used] += 1
+            index += 1
+    def search(self, positions, fixed, rack, min_length):
+        '''
+        Yields words of at least `min_length` and at most len(positions)
+        letters whose i-th letter is in the mask positions[i]. Letters at
+        positions not `fixed` are taken from `rack` (None for no limit).
+        '''
+        masks = self._masks()
+        table = self.transitions
+        counts = [0] * len(ALPHABET)
+        wilds = 0
+        if rack is None:
+            wilds = len(positions)
+        else:
+            for letter in rack:
+                if letter == WILD:
+                    wilds += 1
+                elif letter in LETTER_SLOTS:
+                    counts[LETTER_SLOTS[letter]] += 1
+        available = _counts_mask(counts)
+        max_length = len(positions)
+        stack = []
+        prefix = ''
+        node = 0
+        pending = None
+        while True:
+            if pending is None:
+                # Entered a node, work out which letters may follow
+                depth = len(prefix)
+                mask = masks[node]
+                if mask & END_BIT and depth >= min_length:
+                    yield prefix
+                if depth == max_length:
+                    pending = 0
+                else:
+                    pending = mask & positions[depth]
+                    if not fixed[depth]:
+                        pending &= ALL_LETTERS_MASK if wilds else available
+            while not pending:
+                if not stack:
+                    return
+                node, pending, prefix, used, available = stack.pop()
+                if used == WILD_SLOT:
+                    wilds += 1
+                elif used is not None:
+                    counts[used] += 1
+            bit = pending & -pending
+            pending ^= bit
+            slot = bit.bit_length() - 1
+            if fixed[len(prefix)]:
+                used = None
+            elif counts[slot]:
+                used = slot
+            else:
+                used = WILD_SLOT
+            if table is not None:
+                child = table[node * SLOTS + slot]
+            else:
+                child = self._get_child(node, ALPHABET[slot])
+            stack.append((node, pending, prefix, used, available))
+            if used == WILD_SLOT:
+                wilds -= 1
+            elif used is not None:
+                counts[used] -= 1
+                if not counts[used]:
+                    available &= ~bit
+            prefix += ALPHABET[slot]
+            node = child
+            pending = None
+
+# Loaded on first use by _dawg()
+_DAWG = None
+_LOAD_TIME = None
+_TRANSITIONS = True
+_CACHE_PATH = None
 
-_DAWG = _Dawg(
+_DATA = (
     "eJxknXd8lMXTwOfSLr33nmDvvStWsCB2UUDwkhxJII1LAgkqiB3svYvYBRvYBUUFG9gbYs"
     "OUIwmkkYRi5f3O7nM5+L1/3OfueXZ3+s7ObLtskZa3yqT1rv2l7aAHpf25a8W/3yeyoe91"
     "6fi+Rzq7f5au2W7XxpUu16bj93Z13xfj6ukb7epdcaSr76cJrv47L3VtPvBd18DZN7kGBz"